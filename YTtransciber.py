@@ -1,48 +1,85 @@
-import streamlit as st
-from langchain_core.output_parsers import StrOutputParser
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import (SystemMessagePromptTemplate, HumanMessagePromptTemplate, 
-AIMessagePromptTemplate,ChatPromptTemplate)
-from youtube_transcript_api import YouTubeTranscriptApi
-
-## getting the transcript data from yt videos
+from urllib.parse import parse_qs, urlparse
+from conversation_memory import strip_reasoning
+from resources import get_chat_model, get_gateway, get_tracer, get_transcript_cache
+from transcript_cache import YouTubeTranscriptSource
+from transcript_summarizer import PROMPT_VERSION, TranscriptSummarizer
+from streaming import TimedStream
+
+MODEL = "deepseek-r1:latest"
+
+_transcript_source = YouTubeTranscriptSource()
+
+def set_transcript_source(source):
+    """Replace the transcript source, e.g. with a `FixtureTranscriptSource` in tests and benchmarks."""
+    global _transcript_source
+    _transcript_source = source
+
+def get_cache():
+    """Return the shared transcript and summary cache."""
+    return get_transcript_cache()
+
+def get_video_id(youtube_video_url):
+    """Extract the video ID from a watch, short or youtu.be URL."""
+    parsed = urlparse(youtube_video_url)
+    if parsed.hostname and parsed.hostname.endswith("youtu.be"):
+        return parsed.path.lstrip("/")
+    if parsed.path.startswith("/shorts/"):
+        return parsed.path.split("/")[2]
+    return parse_qs(parsed.query)["v"][0]
+
+## getting the transcript segments from yt videos
+def extract_transcript_segments(youtube_video_url, language="en"):
+    """Return the video ID and its time-stamped transcript segments, from the cache when possible."""
+    video_id = get_video_id(youtube_video_url)
+    segments = get_cache().get_transcript(video_id, language)
+    if segments is None:
+        with get_tracer().span("yt.fetch_transcript", video_id=video_id) as span:
+            segments = _transcript_source.fetch(video_id, language)
+            span.set(segments=len(segments))
+        get_cache().put_transcript(video_id, language, segments)
+    return video_id, segments
+
 def extract_transcript_details(youtube_video_url):
-    try:
-        video_id=youtube_video_url.split("=")[1]
-        
-        transcript_text=YouTubeTranscriptApi.get_transcript(video_id)
-
-        transcript = ""
-        for i in transcript_text:
-            transcript += " " + i["text"]
-
-        return transcript
-
-    except Exception as e:
-        raise e
-
-def create_system_prompt():
-    """Create the system prompt template."""
-    return SystemMessagePromptTemplate.from_template(
-        """You are Yotube video summarizer. You will be taking the transcript text
-            and summarizing the entire video and providing the important summary in points
-            within 250 words. Please provide the summary of the text given here:  """)
-
-def build_prompt_chain():
-    """Build the prompt chain for the AI response."""
-    prompt_sequence = [create_system_prompt()]
-    for msg in st.session_state.yt_messages:
-        if msg["role"] == "user":
-            prompt_sequence.append(HumanMessagePromptTemplate.from_template(msg["content"]))
-        elif msg["role"] == "ai":
-            prompt_sequence.append(AIMessagePromptTemplate.from_template(msg["content"]))
-    return ChatPromptTemplate.from_messages(prompt_sequence)
+    """Return the plain transcript text of a video."""
+    _, segments = extract_transcript_segments(youtube_video_url)
+    return " ".join(segment["text"] for segment in segments)
 
 def create_llm_engine():
-    """Create and configure the LLM engine."""
-    return ChatOllama(model="deepseek-r1:latest", temperature=0.3)
+    """Return the shared, configured LLM engine."""
+    return get_chat_model(MODEL, temperature=0.3)
+
+def create_summarizer(max_workers=4, cancel_event=None):
+    """Create a map-reduce transcript summarizer."""
+    return TranscriptSummarizer(create_llm_engine(), max_workers=max_workers, gateway=get_gateway(),
+                                tracer=get_tracer(), cancel_event=cancel_event)
+
+def yt_transcriber(youtube_video_url):
+    """Generate timestamped notes for a video."""
+    video_id = get_video_id(youtube_video_url)
+    summary = get_cache().get_summary(video_id, MODEL, PROMPT_VERSION)
+    if summary is None:
+        video_id, segments = extract_transcript_segments(youtube_video_url)
+        summary = create_summarizer().summarize(segments, video_id)
+        get_cache().put_summary(video_id, MODEL, PROMPT_VERSION, summary)
+    return summary
+
+def stream_yt_transcriber(youtube_video_url, cancel_event=None):
+    """
+    Stream the notes for a video token by token as a `TimedStream`; setting `cancel_event`
+    stops the summary's model calls, queued or running.
+    """
+    video_id = get_video_id(youtube_video_url)
+    summary = get_cache().get_summary(video_id, MODEL, PROMPT_VERSION)
+    if summary is not None:
+        return TimedStream(iter([summary]), label="yt_transcriber_cached")
+
+    def store(stream):
+        # Only cache notes that were streamed to the end, not ones cut off by a rerun, and store
+        # them without reasoning blocks, like `yt_transcriber` does.
+        if stream.completed:
+            get_cache().put_summary(video_id, MODEL, PROMPT_VERSION, strip_reasoning(stream.text))
 
-def yt_transcriber():
-    """Generate an AI response using the prompt chain."""
-    processing_pipeline= build_prompt_chain() | create_llm_engine() | StrOutputParser()
-    return processing_pipeline.invoke({})
+    _, segments = extract_transcript_segments(youtube_video_url)
+    stream = create_summarizer(cancel_event=cancel_event).stream(segments, video_id)
+    stream.on_complete = store
+    return stream
@@ -1,12 +1,26 @@
-import os
 import time
-import tempfile
+_imports_started = time.perf_counter()
+import uuid
 import streamlit as st
 from streamlit_chat import message
 from chatpdf import ChatPDF
-from codeassist import code_assistant
-from YTtransciber import yt_transcriber, extract_transcript_details
-import pymupdf
+from codeassist import get_memory, stream_code_assistant
+from YTtransciber import stream_yt_transcriber, get_video_id
+from pdf_uploads import content_hash
+from resources import STARTUP_TIMINGS, get_gateway, get_job_manager, get_thumbnail_cache, get_tracer, record_startup
+from jobs import CANCELLED, DONE, QUEUED
+
+record_startup("app_imports", time.perf_counter() - _imports_started)
+
+# Seconds between polls of this session's background jobs while any are active.
+JOB_POLL_SECONDS = 0.5
+
+# Generation jobs: where the reply and its latency go once the job finishes.
+ANSWER_JOBS = {
+    "pdf_answer": ("pdf_messages", "pdf_latency"),
+    "code_answer": ("code_messages", "code_latency"),
+    "yt_notes": ("yt_messages", "yt_latency"),
+}
 
 # --- Initialization ---
 def init_session():
@@ -17,6 +31,9 @@ def init_session():
         "yt_messages": [],
         "pdf_retrieval_k": 5,
         "pdf_retrieval_threshold": 0.2,
+        "debug_tracing": False,
+        "session_id": uuid.uuid4().hex,
+        "pdf_ingesting": {},
     }
     for key, default in state_defaults.items():
         if key not in st.session_state:
@@ -28,49 +45,146 @@ def display_messages(messages_key, key_prefix):
     for i, (msg, is_user) in enumerate(st.session_state.get(messages_key, [])):
         message(msg, is_user=is_user, key=f"{key_prefix}{i}")
 
-def process_input(input_key, messages_key, process_fn, assistant_key, spinner_message="Processing..."):
-    """Process user input and update chat messages."""
+def process_input(input_key, messages_key, pending_key):
+    """Queue user input; the page streams the answer on the next run."""
     user_input = st.session_state.get(input_key, "").strip()
     if user_input:
         st.session_state[messages_key].append((user_input, True))
-        with st.spinner(spinner_message):
-            response = process_fn(user_input, st.session_state[assistant_key])
-        st.session_state[messages_key].append((response, False))
+        st.session_state[pending_key] = user_input
         st.session_state[input_key] = ""
 
+def append_reply(messages_key, text):
+    """Add an assistant reply to a page's chat log."""
+    if messages_key == "pdf_messages":
+        st.session_state[messages_key].append((text, False))
+    else:
+        st.session_state[messages_key].append({"role": "ai", "content": text})
+
+# --- Background Jobs ---
+def submit_job(fn, *args, kind, name=None, **kwargs):
+    """Run `fn(job, *args, **kwargs)` in the background on behalf of this session."""
+    return get_job_manager().submit(fn, *args, kind=kind, name=name, owner=st.session_state["session_id"], **kwargs)
+
+def session_jobs(page):
+    """Return this session's jobs for a page ("pdf", "code" or "yt")."""
+    jobs = get_job_manager().jobs(owner=st.session_state["session_id"])
+    return [job for job in jobs if job.kind.startswith(f"{page}_")]
+
+def generating(page):
+    """Whether a reply for the page is still being generated."""
+    return any(job.kind in ANSWER_JOBS and not job.finished for job in session_jobs(page))
+
+def cancel_jobs(page):
+    for job in session_jobs(page):
+        get_job_manager().cancel(job.id)
+
+def stream_job(job, make_stream):
+    """
+    Job body for generation: build a `TimedStream` with `make_stream(cancel_event)` and consume it
+    into `job.partial`. The job's cancel event reaches the LLM gateway, so cancelling also drops
+    a request that is still queued.
+    """
+    stream = make_stream(job.cancel_event)
+    text = job.stream(stream)
+    return {"text": text, "stats": stream.stats()}
+
+def ingest_job(job, assistant, data, doc_id, source):
+    """Job body for ingesting one uploaded PDF, reporting page progress."""
+    def report(stats):
+        job.update(
+            stats.pages / max(stats.total_pages, 1),
+            f"{stats.pages}/{stats.total_pages} pages · "
+            f"{stats.pages_per_sec:.1f} pages/s · {stats.chunks_per_sec:.1f} chunks/s",
+        )
+
+    started = time.time()
+    assistant.add_documents([(data, doc_id, source)], on_progress=report)
+    return time.time() - started
+
+def finish_job(job):
+    """Move a finished job's outcome into session state."""
+    if job.kind == "pdf_ingest":
+        ingesting = st.session_state["pdf_ingesting"]
+        for doc_id in [doc_id for doc_id, job_id in ingesting.items() if job_id == job.id]:
+            del ingesting[doc_id]
+        if job.status == DONE:
+            text = f"Ingested {job.name} in {job.result:.2f} seconds"
+        elif job.status == CANCELLED:
+            text = f"Cancelled ingestion of {job.name}"
+        else:
+            text = f"⚠️ Ingesting {job.name} failed: {job.error}"
+        append_reply("pdf_messages", text)
+        return
+    messages_key, stats_key = ANSWER_JOBS[job.kind]
+    if job.status == DONE:
+        append_reply(messages_key, job.result["text"])
+        st.session_state[stats_key] = job.result["stats"]
+    elif job.status == CANCELLED:
+        append_reply(messages_key, f"{job.partial}\n\n_(cancelled)_")
+    else:
+        append_reply(messages_key, f"⚠️ {job.error}")
+
+def show_jobs(page):
+    """Collect this session's finished jobs for a page and show the progress of the others."""
+    manager = get_job_manager()
+    jobs = session_jobs(page)
+    finished = [job for job in jobs if job.finished]
+    for job in finished:
+        finish_job(job)
+        manager.remove(job.id)
+    if finished:
+        st.rerun()
+    for job in jobs:
+        if job.kind in ANSWER_JOBS:
+            with st.chat_message("ai"):
+                st.markdown(job.partial or ("⏳ Queued..." if job.status == QUEUED else "⏳ Thinking..."))
+        else:
+            st.progress(job.progress or 0.0, text=f"📥 {job.name}: {job.message or job.status}")
+        st.button("Cancel", key=f"cancel_{job.id}", on_click=manager.cancel, args=(job.id,))
+
+def job_panel(page):
+    """Render the page's jobs in a fragment that polls on its own while any are active."""
+    active = bool(session_jobs(page))
+    st.fragment(show_jobs, run_every=JOB_POLL_SECONDS if active else None)(page)
+
+def display_latency(stats_key):
+    """Show time-to-first-token and total latency of the last response."""
+    stats = st.session_state.get(stats_key)
+    if stats and stats["ttft"] is not None:
+        caption = f"⏱️ First token in {stats['ttft']:.2f}s · total {stats['total']:.2f}s · {stats['tokens']} tokens"
+        if "context_tokens" in stats:
+            caption += f" · context {stats['context_tokens']} tokens ({stats['tokens_saved']} saved)"
+        st.caption(caption)
+
 # --- Utility Functions ---
 def get_pdf_first_page_image(file):
-    """Extract and return the image path of the first page of the uploaded PDF."""
-    temp_pdf_path = "temp.pdf"
-    with open(temp_pdf_path, "wb") as f:
-        f.write(file.getvalue())
-    doc = pymupdf.open(temp_pdf_path)
-    os.makedirs("static", exist_ok=True)
-    pix = doc[0].get_pixmap()
-    image_path = os.path.join("static", "first_page.png")
-    pix.save(image_path)
-    return image_path
+    """Return PNG bytes of the first page of an uploaded PDF, rendered once per distinct file."""
+    return get_thumbnail_cache().get(file)
 
 def read_and_save_file():
-    """Handle file upload and ingestion."""
-    st.session_state["pdf_assistant"].clear()
+    """
+    Sync the assistant's documents with the uploader: remove dropped files (cancelling their
+    ingestion if it is still running) and queue one background ingest per new file.
+    """
+    assistant = st.session_state["pdf_assistant"]
+    ingesting = st.session_state["pdf_ingesting"]
     st.session_state["pdf_messages"] = []
     st.session_state["user_input"] = ""
 
-    for file in st.session_state["file_uploader"]:
-        with tempfile.NamedTemporaryFile(delete=False) as tf:
-            tf.write(file.getbuffer())
-            file_path = tf.name
-
-        with st.session_state["ingestion_spinner"], st.spinner(f"Ingesting {file.name}..."):
-            t0 = time.time()
-            st.session_state["pdf_assistant"].ingest(file_path)
-            t1 = time.time()
-
-        st.session_state["pdf_messages"].append(
-            (f"Ingested {file.name} in {t1 - t0:.2f} seconds", False)
-        )
-        os.remove(file_path)
+    uploads = {content_hash(file.getbuffer()): file for file in st.session_state["file_uploader"]}
+    for doc_id, job_id in list(ingesting.items()):
+        if doc_id not in uploads:
+            get_job_manager().cancel(job_id)
+    for doc in assistant.list_documents():
+        if doc["doc_id"] not in uploads:
+            assistant.remove_document(doc["doc_id"])
+
+    ingested = {doc["doc_id"] for doc in assistant.list_documents()}
+    for doc_id, file in uploads.items():
+        if doc_id not in ingested and doc_id not in ingesting:
+            job = submit_job(ingest_job, assistant, file.getvalue(), doc_id, file.name, kind="pdf_ingest",
+                             name=file.name)
+            ingesting[doc_id] = job.id
 
 # --- Functionality Pages ---
 def pdf_chat_page():
@@ -87,37 +201,57 @@ def pdf_chat_page():
         st.session_state["pdf_retrieval_threshold"] = st.slider(
             "Similarity Score Threshold", min_value=0.0, max_value=1.0, value=0.2, step=0.05
         )
+        st.session_state["pdf_hybrid"] = st.toggle(
+            "Hybrid (BM25) retrieval", value=True, help="Also match exact keywords, clause numbers and codes"
+        )
+        st.session_state["pdf_rerank"] = st.toggle(
+            "Rerank", value=False, help="Reorder results with a local cross-encoder (needs sentence-transformers)"
+        )
         # PDF Preview
         uploaded_files = st.file_uploader("Upload a document", type=["pdf"], key="file_uploader", 
         on_change=read_and_save_file, label_visibility="collapsed", accept_multiple_files=True,)
         if isinstance(uploaded_files, list):
             for uploaded_file in uploaded_files:
-                image_path = get_pdf_first_page_image(uploaded_file)
-                st.image(image_path, caption="First Page of PDF")
+                thumbnail = get_pdf_first_page_image(uploaded_file)
+                st.image(thumbnail, caption="First Page of PDF")
         else:
-            image_path = get_pdf_first_page_image(uploaded_files)
-            st.image(image_path, caption="First Page of PDF")
-
-        st.session_state["ingestion_spinner"] = st.empty()
+            thumbnail = get_pdf_first_page_image(uploaded_files)
+            st.image(thumbnail, caption="First Page of PDF")
 
     # Lazy initialization of PDF assistant
     if "pdf_assistant" not in st.session_state:
         st.session_state["pdf_assistant"] = ChatPDF()
 
-    # Display chat messages and process input
+    # Answer any queued question in the background; chat stays usable while documents ingest
+    pending = st.session_state.pop("pdf_pending", None)
+    if pending:
+        assistant = st.session_state["pdf_assistant"]
+        options = dict(
+            k=st.session_state["pdf_retrieval_k"], score_threshold=st.session_state["pdf_retrieval_threshold"],
+            debug=st.session_state["debug_tracing"], hybrid=st.session_state["pdf_hybrid"],
+            rerank=st.session_state["pdf_rerank"],
+        )
+        submit_job(stream_job, lambda cancel_event: assistant.stream(pending, cancel_event=cancel_event, **options),
+                   kind="pdf_answer", name=pending)
+
     display_messages("pdf_messages", "pdf_")
-    st.text_input(
-        "Message", key="pdf_user_input",
-        on_change=lambda: process_input(
-            "pdf_user_input", "pdf_messages",
-            lambda input, assistant: assistant.ask(input, k=st.session_state["pdf_retrieval_k"], score_threshold=st.session_state["pdf_retrieval_threshold"]),
-            "pdf_assistant", "🧠 Analysing Document..."
+    job_panel("pdf")
+    display_latency("pdf_latency")
+    cache_stats = st.session_state["pdf_assistant"].answer_cache.stats()
+    if cache_stats["hits"]:
+        st.caption(
+            f"♻️ Answer cache: {cache_stats['hit_rate']:.0%} hit rate · "
+            f"{cache_stats['saved_llm_seconds']:.1f}s of generation saved"
         )
+    st.text_input(
+        "Message", key="pdf_user_input", disabled=generating("pdf"),
+        on_change=lambda: process_input("pdf_user_input", "pdf_messages", "pdf_pending")
     )
 
     if st.button("Clear Chat"):
+        cancel_jobs("pdf")
         st.session_state["pdf_messages"] = []
-        st.session_state["pdf_assistant"] = ChatPDF()
+        st.session_state["pdf_assistant"].clear()
 
 def code_assistant_page():
     st.title("🧠 Code Companion AI")
@@ -145,26 +279,37 @@ def code_assistant_page():
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
 
+    job_panel("code")
+    display_latency("code_latency")
+    memory = st.session_state.get("code_memory")
+    if memory and memory.turn_stats:
+        last = memory.turn_stats[-1]
+        st.caption(
+            f"🧾 Prompt ≈{last['prompt_tokens']} tokens · {last['verbatim_turns']} recent turns · "
+            f"{last['folded_turns']} summarized"
+        )
+
         # Chat input and processing
-    user_query = st.chat_input("Type your coding question here...")
+    user_query = st.chat_input("Type your coding question here...", disabled=generating("code"))
 
     if user_query:
         # Add user message to log
         st.session_state.code_messages.append({"role": "user", "content": user_query})
-            
-        # Generate AI response
-        with st.spinner("🧠 Processing..."):
-            ai_response = code_assistant()
-            
-        # Add AI response to log
-        st.session_state.code_messages.append({"role": "ai", "content": ai_response})
-            
+
+        # Snapshot the chat log into this session's memory here; the prompt (including any
+        # summarization of older turns) is built and the reply streamed in the background
+        memory, debug = get_memory(), st.session_state["debug_tracing"]
+        submit_job(stream_job, lambda cancel_event: stream_code_assistant(debug, cancel_event, memory),
+                   kind="code_answer", name=user_query[:80])
+
         # Rerun to update chat display
         st.rerun()
 
     if st.button("Clear Chat"):
-        st.session_state["yt_messages"] = []
-        st.session_state["yt_assistant"].clear()
+        cancel_jobs("code")
+        st.session_state["code_messages"] = []
+        st.session_state.pop("code_memory", None)
+        st.session_state.pop("code_latency", None)
 
 
 def yt_transcriber_page():
@@ -191,28 +336,26 @@ def yt_transcriber_page():
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
 
+    job_panel("yt")
+    display_latency("yt_latency")
+
     if youtube_link:
-        video_id = youtube_link.split("=")[1]
+        video_id = get_video_id(youtube_link)
         st.image(f"http://img.youtube.com/vi/{video_id}/0.jpg", use_container_width=True)
 
-    if st.button("Get Detailed Notes"):
-        transcript_text=extract_transcript_details(youtube_link)
-
-        if transcript_text:
-                # Add user message to log
-            st.session_state.yt_messages.append({"role": "user", "content": transcript_text})
-                
-                # Generate AI response
-            with st.spinner("🧠 Summarizing..."):
-                ai_response = yt_transcriber()
-                
-                # Add AI response to log
-            st.session_state.yt_messages.append({"role": "ai", "content": ai_response})
-                
-                # Rerun to update chat display
-            st.rerun()
-    
+    if st.button("Get Detailed Notes", disabled=generating("yt")):
+        # Add user message to log
+        st.session_state.yt_messages.append({"role": "user", "content": youtube_link})
+
+        # Fetch the transcript and stream the notes in the background
+        submit_job(stream_job, lambda cancel_event: stream_yt_transcriber(youtube_link, cancel_event),
+                   kind="yt_notes", name=youtube_link)
+
+        # Rerun to update chat display
+        st.rerun()
+
     if st.button("Clear Chat"):
+        cancel_jobs("yt")
         st.session_state["yt_messages"] = []
         st.session_state["yt_assistant"].clear()
 
@@ -228,6 +371,22 @@ def main():
         ["PDF Chat", "Code Assistant", "YT Transcriber"]
     )
 
+    gateway_stats = get_gateway().stats()
+    st.sidebar.caption(
+        f"🚦 LLM queue: {gateway_stats['queue_depth']} waiting · "
+        f"{gateway_stats['active']}/{gateway_stats['max_concurrency']} running"
+        + "".join(f" · {feature} p95 wait {w['p95']:.1f}s" for feature, w in gateway_stats["wait_seconds"].items())
+    )
+    job_stats = get_job_manager().stats()
+    st.sidebar.caption(f"🧵 Background jobs: {job_stats['running']} running · {job_stats['queued']} queued")
+    st.sidebar.toggle("Debug tracing", key="debug_tracing", help="Print a LangChain trace of your requests")
+    if st.session_state["debug_tracing"]:
+        st.sidebar.json(STARTUP_TIMINGS, expanded=False)
+        st.sidebar.caption("Latency by stage (seconds)")
+        st.sidebar.dataframe([{"stage": name, **row} for name, row in get_tracer().stats().items()], hide_index=True)
+        if st.sidebar.button("Export Prometheus metrics"):
+            st.sidebar.caption(f"Wrote {get_tracer().export_prometheus()}")
+
     # Display the selected functionality
     if functionality == "PDF Chat":
         pdf_chat_page()
@@ -0,0 +1,95 @@
+"""
+Benchmark ChatPDF ingestion and question answering against a fake Ollama server.
+
+    python -m benchmarks.bench_chatpdf --pages 10 100 1000 --k 1 3 5 10
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.bench_vehicle_db import percentile
+from benchmarks.synthetic import synthetic_pdf, synthetic_questions
+from fake_ollama import FakeOllamaServer
+
+
+def run(pages=(10, 100), ks=(1, 3, 5, 10), questions: int = 20, chunk_size: int = 1024, chunk_overlap: int = 100,
+        prefill_ms: float = 50, tokens_per_sec: float = 200, reply_tokens: int = 32, embedding_ms: float = 0,
+        seed: int = 0):
+    """
+    Ingest synthetic PDFs of each size in `pages`, then time `questions` answers at each k on the
+    largest one. Every run uses fresh caches, so nothing is served from a previous run.
+    """
+    # Spans go to memory only; the stage breakdown is part of the result.
+    os.environ["TRACE_FILE"] = ""
+    from chatpdf import ChatPDF
+    from embedding_cache import EmbeddingCache
+    from resources import get_tracer
+    from semantic_cache import SemanticCache
+
+    directory = tempfile.mkdtemp(prefix="bench_chatpdf_")
+    server = FakeOllamaServer(prefill_seconds=prefill_ms / 1000, tokens_per_second=tokens_per_sec,
+                              reply_tokens=reply_tokens, embedding_seconds=embedding_ms / 1000).start()
+    os.environ["OLLAMA_HOST"] = server.url
+    results = {"benchmark": "chatpdf", "chunk_size": chunk_size, "chunk_overlap": chunk_overlap,
+               "fake_ollama": {"prefill_ms": prefill_ms, "tokens_per_sec": tokens_per_sec,
+                               "reply_tokens": reply_tokens, "embedding_ms": embedding_ms},
+               "ingest": [], "ask": []}
+    try:
+        assistant = None
+        for size in pages:
+            pdf = synthetic_pdf(size, seed=seed)
+            assistant = ChatPDF(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                embedding_cache=EmbeddingCache(os.path.join(directory, f"embeddings-{size}.db")),
+                                persist_directory=os.path.join(directory, "chroma"), answer_cache=SemanticCache())
+            started = time.perf_counter()
+            entry = assistant.add_documents([(pdf, f"synthetic-{size}", f"synthetic-{size}.pdf")])
+            seconds = time.perf_counter() - started
+            results["ingest"].append({
+                "pages": size,
+                "chunks": entry[f"synthetic-{size}"]["chunks"],
+                "seconds": round(seconds, 3),
+                "pages_per_sec": round(size / seconds, 2),
+            })
+
+        for k in ks:
+            latencies, context_tokens = [], []
+            for question in synthetic_questions(questions, pages[-1], seed=seed + k):
+                started = time.perf_counter()
+                assistant.ask(question, k=k, score_threshold=0.0)
+                latencies.append(time.perf_counter() - started)
+                context_tokens.append((assistant.last_context_stats or {}).get("context_tokens", 0))
+            results["ask"].append({
+                "k": k,
+                "questions": questions,
+                "p50_seconds": round(percentile(latencies, 0.5), 4),
+                "p95_seconds": round(percentile(latencies, 0.95), 4),
+                "mean_context_tokens": round(sum(context_tokens) / len(context_tokens), 1),
+            })
+        results["stages"] = get_tracer().stats()
+    finally:
+        server.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--prefill-ms", type=float, default=50)
+    parser.add_argument("--tokens-per-sec", type=float, default=200)
+    parser.add_argument("--embedding-ms", type=float, default=0)
+    args = parser.parse_args()
+    result = run(args.pages, args.k, args.questions, args.chunk_size, args.chunk_overlap,
+                 args.prefill_ms, args.tokens_per_sec, embedding_ms=args.embedding_ms)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark map-reduce transcript summarization against a fake Ollama server.
+
+    python -m benchmarks.bench_transcripts --minutes 30 120 600 --workers 4
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.synthetic import synthetic_transcript
+from fake_ollama import FakeOllamaServer
+
+
+def run(minutes=(30, 120), max_workers: int = 4, prefill_ms: float = 200, prefill_per_1k_chars_ms: float = 20,
+        tokens_per_sec: float = 60, reply_tokens: int = 120, seed: int = 0):
+    """Summarize a synthetic transcript of each length and report wall-clock time and map/reduce stages."""
+    os.environ["TRACE_FILE"] = ""
+    from langchain_ollama import ChatOllama
+    from tracing import Tracer
+    from transcript_summarizer import TranscriptSummarizer, chunk_segments
+
+    server = FakeOllamaServer(prefill_seconds=prefill_ms / 1000, prefill_per_1k_chars=prefill_per_1k_chars_ms / 1000,
+                              tokens_per_second=tokens_per_sec, reply_tokens=reply_tokens).start()
+    results = {"benchmark": "transcripts", "max_workers": max_workers,
+               "fake_ollama": {"prefill_ms": prefill_ms, "prefill_per_1k_chars_ms": prefill_per_1k_chars_ms,
+                               "tokens_per_sec": tokens_per_sec, "reply_tokens": reply_tokens},
+               "runs": []}
+    try:
+        llm = ChatOllama(model="fake", base_url=server.url)
+        for length in minutes:
+            tracer = Tracer()
+            summarizer = TranscriptSummarizer(llm, max_workers=max_workers, tracer=tracer)
+            segments = synthetic_transcript(length, seed=seed)
+            started = time.perf_counter()
+            stream = summarizer.stream(segments, "synthetic")
+            for _ in stream:
+                pass
+            results["runs"].append({
+                "minutes": length,
+                "segments": len(segments),
+                "chunks": len(chunk_segments(segments, summarizer.chunk_chars, summarizer.chunk_seconds)),
+                "seconds": round(time.perf_counter() - started, 3),
+                "ttft_seconds": stream.stats()["ttft"],
+                "stages": tracer.stats(),
+            })
+    finally:
+        server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, nargs="+", default=[30, 120])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--prefill-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-sec", type=float, default=60)
+    args = parser.parse_args()
+    result = run(args.minutes, args.workers, args.prefill_ms, tokens_per_sec=args.tokens_per_sec)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark VehicleDatabase ingest throughput and per-vehicle time-range query latency.
+
+    python -m benchmarks.bench_vehicle_db --rows 1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from vehicle_db import VehicleDatabase, ConnectionPool
+
+
+def synthetic_records(rows: int, vehicles: int = 100, seed: int = 0):
+    """Yield `rows` random telemetry records spread over 30 days."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    for _ in range(rows):
+        yield (
+            f"REV{rng.randrange(vehicles)}",
+            start + timedelta(seconds=rng.randrange(30 * 86400)),
+            rng.uniform(10.0, 30.0),
+            rng.uniform(75.0, 85.0),
+            rng.uniform(0, 100),
+            "ON",
+            11.059821,
+            78.387451,
+        )
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(rows: int, vehicles: int = 100, queries: int = 200, chunk_size: int = 50_000,
+        defer_indexes: bool = True, db_file: str = None, seed: int = 0):
+    """Load `rows` synthetic records into a fresh database and time range queries against it."""
+    directory = None
+    if db_file is None:
+        directory = tempfile.mkdtemp(prefix="bench_vehicle_db_")
+        db_file = os.path.join(directory, "vehicles.db")
+
+    with VehicleDatabase(db_file, pool=ConnectionPool(db_file, size=1)) as db:
+        started = time.perf_counter()
+        rate = db.bulk_load(synthetic_records(rows, vehicles, seed), chunk_size=chunk_size,
+                            defer_indexes=defer_indexes)
+        ingest_seconds = time.perf_counter() - started
+
+        rng = random.Random(seed + 1)
+        latencies = []
+        for _ in range(queries):
+            day = datetime(2024, 1, 1) + timedelta(days=rng.randrange(29))
+            params = (f"REV{rng.randrange(vehicles)}", day.strftime("%Y-%m-%d %H:%M:%S"),
+                      (day + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S"))
+            t0 = time.perf_counter()
+            db.fetch_data(
+                "SELECT AVG(speed), COUNT(*) FROM vehicle_data "
+                "WHERE vehicle_id = ? AND event_time >= ? AND event_time < ?", params
+            )
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    if directory:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    return {
+        "benchmark": "vehicle_db",
+        "rows": rows,
+        "vehicles": vehicles,
+        "ingest_seconds": round(ingest_seconds, 3),
+        "ingest_rows_per_sec": round(rate),
+        "query_count": queries,
+        "query_p50_ms": round(percentile(latencies, 0.50), 3),
+        "query_p95_ms": round(percentile(latencies, 0.95), 3),
+        "query_mean_ms": round(statistics.fmean(latencies), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--vehicles", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--keep-indexes", action="store_true", help="Do not defer index builds during the load.")
+    parser.add_argument("--db", help="Database file to load into (default: a temporary file).")
+    args = parser.parse_args()
+    result = run(args.rows, args.vehicles, args.queries, args.chunk_size, not args.keep_indexes, args.db)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
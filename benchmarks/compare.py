@@ -0,0 +1,87 @@
+"""
+Compare two benchmark reports and flag regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.1
+
+Latencies (seconds, ms, p50/p95) should go down and rates (per_sec) should go up. The exit
+status is 1 when any metric got worse by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("seconds", "_ms", "p50", "p95", "max")
+HIGHER_IS_BETTER = ("per_sec",)
+
+
+def _label(item, index):
+    """Name list entries by their size parameter so runs line up even if the lists differ."""
+    if isinstance(item, dict):
+        for key in ("pages", "rows", "k", "minutes"):
+            if key in item:
+                return f"{key}={item[key]}"
+    return str(index)
+
+
+def flatten(value, prefix=""):
+    """Return `{dotted.path: number}` for every numeric leaf of a report."""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((_label(item, i), item) for i, item in enumerate(value))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    else:
+        return {}
+    flat = {}
+    for key, item in items:
+        flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def direction(path: str):
+    name = path.rsplit(".", 1)[-1]
+    if any(marker in name for marker in HIGHER_IS_BETTER):
+        return 1
+    if any(marker in name for marker in LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(baseline, candidate, threshold: float = 0.1):
+    """Return `(regressions, improvements)` as lists of `(path, old, new, relative change)`."""
+    old, new = flatten(baseline.get("results", baseline)), flatten(candidate.get("results", candidate))
+    regressions, improvements = [], []
+    for path in sorted(old.keys() & new.keys()):
+        sign = direction(path)
+        if not sign or not old[path]:
+            continue
+        change = (new[path] - old[path]) / abs(old[path])
+        if change * sign < -threshold:
+            regressions.append((path, old[path], new[path], change))
+        elif change * sign > threshold:
+            improvements.append((path, old[path], new[path], change))
+    return regressions, improvements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change to report (default 10%%)")
+    args = parser.parse_args()
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+    regressions, improvements = compare(baseline, candidate, args.threshold)
+    print(f"Comparing {baseline.get('commit')} -> {candidate.get('commit')}")
+    for title, rows in (("Regressions", regressions), ("Improvements", improvements)):
+        print(f"{title}: {len(rows)}")
+        for path, before, after, change in rows:
+            print(f"  {path}: {before:g} -> {after:g} ({change:+.1%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
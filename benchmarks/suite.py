@@ -0,0 +1,84 @@
+"""
+Run every benchmark and write one JSON report, tagged with the current commit.
+
+    python -m benchmarks.suite --preset quick --output bench-results.json
+    python -m benchmarks.compare baseline.json bench-results.json
+
+All model calls go to an in-process fake Ollama server, so results are reproducible offline.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks import bench_chatpdf, bench_transcripts, bench_vehicle_db
+
+PRESETS = {
+    "quick": {
+        "chatpdf_pages": [10, 100],
+        "chatpdf_k": [1, 3, 5, 10],
+        "chatpdf_questions": 10,
+        "vehicle_rows": [10_000, 100_000],
+        "transcript_minutes": [30, 120],
+    },
+    "full": {
+        "chatpdf_pages": [10, 100, 1000, 5000],
+        "chatpdf_k": [1, 3, 5, 10],
+        "chatpdf_questions": 50,
+        "vehicle_rows": [10_000, 100_000, 1_000_000, 10_000_000],
+        "transcript_minutes": [30, 120, 600],
+    },
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(preset: str = "quick", only=None, seed: int = 0):
+    config = PRESETS[preset]
+    report = {
+        "commit": git_commit(),
+        "preset": preset,
+        "seed": seed,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": {},
+    }
+    started = time.perf_counter()
+    if not only or "chatpdf" in only:
+        report["results"]["chatpdf"] = bench_chatpdf.run(config["chatpdf_pages"], config["chatpdf_k"],
+                                                         config["chatpdf_questions"], seed=seed)
+    if not only or "vehicle_db" in only:
+        report["results"]["vehicle_db"] = [bench_vehicle_db.run(rows, seed=seed) for rows in config["vehicle_rows"]]
+    if not only or "transcripts" in only:
+        report["results"]["transcripts"] = bench_transcripts.run(config["transcript_minutes"], seed=seed)
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--only", nargs="+", choices=["chatpdf", "vehicle_db", "transcripts"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    report = json.dumps(run(args.preset, args.only, args.seed), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
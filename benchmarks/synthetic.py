@@ -0,0 +1,79 @@
+"""
+Deterministic synthetic inputs for the benchmarks: contract-like PDFs and long transcripts.
+"""
+import random
+
+SUBJECTS = ("The supplier", "The customer", "Each party", "The contractor", "The licensee", "The operator")
+VERBS = ("shall deliver", "must notify", "may terminate", "shall maintain", "will invoice", "shall inspect")
+OBJECTS = ("all vehicles in the fleet", "the service report", "the agreed spare parts", "the monthly statement",
+           "the safety records", "any defective component")
+CONDITIONS = ("within thirty days", "before the end of each quarter", "upon written request",
+              "unless otherwise agreed", "at its own cost", "in accordance with Schedule B")
+
+
+def sentence(rng: random.Random, clause: str) -> str:
+    return (f"Clause {clause}: {rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} "
+            f"{rng.choice(CONDITIONS)}, reference part AB-{rng.randrange(10000):04d}.")
+
+
+def page_lines(rng: random.Random, page: int, lines: int):
+    return [sentence(rng, f"{page + 1}.{line + 1}") for line in range(lines)]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def synthetic_pdf(pages: int, lines_per_page: int = 40, seed: int = 0) -> bytes:
+    """
+    Return the bytes of a text-only PDF with `pages` pages of numbered contract clauses.
+    The PDF is written directly (Helvetica, one content stream per page) so no PDF library is needed.
+    """
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        text = " T* ".join(f"({_escape(line)}) Tj" for line in page_lines(rng, page, lines_per_page))
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode("ascii")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def synthetic_questions(count: int, pages: int, seed: int = 0):
+    """Return `count` questions that refer to clauses present in a synthetic PDF of `pages` pages."""
+    rng = random.Random(seed)
+    return [
+        f"What does clause {rng.randrange(pages) + 1}.{rng.randrange(10) + 1} say about {rng.choice(OBJECTS)}?"
+        for _ in range(count)
+    ]
+
+
+def synthetic_transcript(minutes: float, words_per_segment: int = 12, seconds_per_segment: float = 4.0,
+                         seed: int = 0):
+    """Return transcript segments (`text`, `start`, `duration`) covering `minutes` of speech."""
+    rng = random.Random(seed)
+    vocabulary = [word for phrase in SUBJECTS + VERBS + OBJECTS + CONDITIONS for word in phrase.lower().split()]
+    segments = []
+    start = 0.0
+    while start < minutes * 60:
+        text = " ".join(rng.choice(vocabulary) for _ in range(words_per_segment))
+        segments.append({"text": text, "start": round(start, 2), "duration": seconds_per_segment})
+        start += seconds_per_segment
+    return segments
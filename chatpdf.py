@@ -1,101 +1,447 @@
-from langchain_core.globals import set_verbose, set_debug
-from langchain_ollama import ChatOllama, OllamaEmbeddings
+from langchain_ollama import OllamaEmbeddings
 from langchain.schema.output_parser import StrOutputParser
 from langchain_community.vectorstores import Chroma
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema.runnable import RunnablePassthrough
-from langchain_community.vectorstores.utils import filter_complex_metadata
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.documents import Document
+from embedding_cache import CachedEmbeddings, EmbeddingCache, file_sha256
+from resources import (
+    debug_config, get_answer_cache, get_chat_model, get_chroma_client, get_embeddings, get_gateway, get_tracer,
+)
+from context_packer import ContextPacker
+from hybrid_retriever import BM25Index, get_reranker, reciprocal_rank_fusion
+from ingest_pipeline import IngestionPipeline
+from semantic_cache import SemanticCache, fingerprint
+from streaming import TimedStream
+from tracing import first_token_timer
+from concurrent.futures import ThreadPoolExecutor
 import logging
-
-set_debug(True)
-set_verbose(True)
+import time
+import uuid
+import weakref
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+NO_CONTEXT_ANSWER = "No relevant context found in the document to answer your question."
+
+# Bump when the RAG prompt changes so cached answers are not reused.
+PROMPT_VERSION = "2"
+
+RAG_PROMPT = ChatPromptTemplate.from_template(
+    """
+    You are a helpful assistant answering questions based on the uploaded document.
+    Context:
+    {context}
+    
+    Question:
+    {question}
+    
+    Answer concisely and accurately in three sentences or less, citing the [source, page] you used.
+    """
+)
+
+
+def _delete_collection(client, name: str):
+    """Delete a private collection once its `ChatPDF` is gone."""
+    try:
+        client.delete_collection(name)
+        logger.info(f"Deleted collection {name}.")
+    except Exception as e:
+        logger.warning(f"Could not delete collection {name}: {e}")
+
+
+def _sources(docs):
+    """Return the `{"doc_id", "source", "page"}` of each retrieved chunk."""
+    return [
+        {"doc_id": doc.metadata.get("doc_id"), "source": doc.metadata.get("source"), "page": doc.metadata.get("page")}
+        for doc in docs
+    ]
+
 
 class ChatPDF:
     """A class for handling PDF ingestion and question answering using RAG."""
 
-    def __init__(self, llm_model: str = "deepseek-r1:latest", embedding_model: str = "mxbai-embed-large"):
+    def __init__(self, llm_model: str = "deepseek-r1:latest", embedding_model: str = "mxbai-embed-large",
+                 chunk_size: int = 1024, chunk_overlap: int = 100, embedding_cache: EmbeddingCache = None,
+                 collection_name: str = None, persist_directory: str = None,
+                 embed_batch_size: int = 64, embed_concurrency: int = 2, answer_cache: SemanticCache = None,
+                 context_token_budget: int = 1500):
         """
         Initialize the ChatPDF instance with an LLM and embedding model.
+        Chunk embeddings are served from `embedding_cache` (a shared on-disk cache by default).
+        Pass `collection_name` to keep documents in a long-lived Chroma collection shared across sessions
+        (stored in `persist_directory`, default chroma_db). Otherwise a private collection is created for this
+        instance, in memory unless `persist_directory` is given, and deleted when the instance is closed or
+        garbage-collected (e.g. when its Streamlit session expires).
+        `embed_batch_size` and `embed_concurrency` tune the ingestion pipeline's embedding stage.
+        `answer_cache` serves answers to semantically equivalent questions over the same documents.
+        Retrieved chunks are stitched, deduplicated and packed into `context_token_budget` tokens.
+        """
+        self.llm_model = llm_model
+        self.model = get_chat_model(llm_model)
+        self.answer_cache = answer_cache or get_answer_cache()
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        namespace = f"chunk_size={chunk_size};chunk_overlap={chunk_overlap}"
+        if embedding_cache is None:
+            self.embeddings = get_embeddings(embedding_model, namespace)
+        else:
+            self.embeddings = CachedEmbeddings(
+                OllamaEmbeddings(model=embedding_model), embedding_cache, model_name=embedding_model, namespace=namespace
+            )
+        self.embedding_cache = self.embeddings.cache
+        self.prompt = RAG_PROMPT
+        self.context_packer = ContextPacker(token_budget=context_token_budget)
+        self.last_context_stats = None
+        self.embed_batch_size = embed_batch_size
+        self.embed_concurrency = embed_concurrency
+        if collection_name and persist_directory is None:
+            persist_directory = "chroma_db"
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name or f"chatpdf-{uuid.uuid4().hex[:12]}"
+        self.vector_store = self._open_collection()
+        self._finalizer = None
+        if collection_name is None:
+            self._finalizer = weakref.finalize(
+                self, _delete_collection, get_chroma_client(self.persist_directory), self.collection_name
+            )
+        self.bm25 = BM25Index()
+        self.documents = self._load_registry()
+
+    def _open_collection(self):
+        """Open this instance's collection on the shared Chroma client."""
+        return Chroma(
+            client=get_chroma_client(self.persist_directory),
+            collection_name=self.collection_name,
+            embedding_function=self.embeddings,
+        )
+
+    def _load_registry(self):
+        """
+        Rebuild the document registry and BM25 index from the chunks already stored in the collection.
         """
-        self.model = ChatOllama(model=llm_model)
-        self.embeddings = OllamaEmbeddings(model=embedding_model)
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1024, chunk_overlap=100)
-        self.prompt = ChatPromptTemplate.from_template(
-            """
-            You are a helpful assistant answering questions based on the uploaded document.
-            Context:
-            {context}
-            
-            Question:
-            {question}
-            
-            Answer concisely and accurately in three sentences or less.
-            """
+        registry = {}
+        stored = self.vector_store.get(include=["metadatas", "documents"])
+        for chunk_id, metadata, text in zip(stored["ids"], stored["metadatas"], stored["documents"]):
+            doc_id = (metadata or {}).get("doc_id")
+            if doc_id is None:
+                continue
+            entry = registry.setdefault(doc_id, {"doc_id": doc_id, "source": metadata.get("source"), "chunks": 0})
+            entry["chunks"] += 1
+            self.bm25.add([chunk_id], [doc_id], [text])
+        return registry
+
+    def add_documents(self, files, on_progress=None):
+        """
+        Ingest several `(pdf_file_path, doc_id, source)` triples through the streaming pipeline.
+        A PDF may be given as bytes instead of a path. Documents whose ID is already registered are skipped,
+        and of several files with the same ID (e.g. identical uploads) only the first is ingested.
+        """
+        unique = {}
+        for path, doc_id, source in files:
+            if doc_id in self.documents:
+                continue
+            if doc_id in unique:
+                logger.info(f"Skipping {source or doc_id}: same document as {unique[doc_id][2] or doc_id}.")
+                continue
+            unique[doc_id] = (path, doc_id, source)
+        files = list(unique.values())
+        if not files:
+            return {}
+        logger.info(f"Starting ingestion for files: {[source or doc_id for _, doc_id, source in files]}")
+        pipeline = IngestionPipeline(
+            self.embeddings,
+            self._write_chunks,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            batch_size=self.embed_batch_size,
+            embed_concurrency=self.embed_concurrency,
+            on_progress=on_progress,
         )
-        self.vector_store = None
-        self.retriever = None
+        with get_tracer().span("pdf.ingest", files=len(files)) as span:
+            try:
+                counts, stats = pipeline.run(files)
+            except BaseException:
+                # Drop the chunks already written, e.g. when a background ingest is cancelled.
+                for _, doc_id, _ in files:
+                    self.remove_document(doc_id)
+                raise
+            span.set(**stats.as_dict())
+        self._invalidate_answers(doc_id for _, doc_id, _ in files)
+        for path, doc_id, source in files:
+            self.documents[doc_id] = {"doc_id": doc_id, "source": source or path, "chunks": counts[doc_id]}
+        logger.info(f"Ingestion completed in {stats.elapsed:.2f}s. Embedding cache: {self.embedding_cache.stats()}")
+        return {doc_id: self.documents[doc_id] for _, doc_id, _ in files}
+
+    def _write_chunks(self, ids, texts, metadatas, vectors):
+        """Bulk-upsert one embedded batch of chunks into the collection and the BM25 index."""
+        self.vector_store._collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=vectors)
+        self.bm25.add(ids, [metadata["doc_id"] for metadata in metadatas], texts)
+
+    def add_document(self, pdf_file_path: str, doc_id: str = None, source: str = None):
+        """
+        Split and embed a PDF and upsert its chunks into the collection under `doc_id`.
+        The document ID defaults to the file's content hash, so re-adding an unchanged file is a no-op.
+        """
+        doc_id = doc_id or file_sha256(pdf_file_path)
+        if doc_id in self.documents:
+            logger.info(f"Document {doc_id} is already ingested; skipping.")
+            return self.documents[doc_id]
+        return self.add_documents([(pdf_file_path, doc_id, source or pdf_file_path)])[doc_id]
 
     def ingest(self, pdf_file_path: str):
         """
         Ingest a PDF file, split its contents, and store the embeddings in the vector store.
         """
-        logger.info(f"Starting ingestion for file: {pdf_file_path}")
-        docs = PyPDFLoader(file_path=pdf_file_path).load()
-        chunks = self.text_splitter.split_documents(docs)
-        chunks = filter_complex_metadata(chunks)
+        return self.add_document(pdf_file_path)
 
-        self.vector_store = Chroma.from_documents(
-            documents=chunks,
-            embedding=self.embeddings,
-            persist_directory="chroma_db",
-        )
-        logger.info("Ingestion completed. Document embeddings stored successfully.")
+    def remove_document(self, doc_id: str):
+        """
+        Delete every chunk of a document from the collection.
+        """
+        ids = self.vector_store.get(where={"doc_id": doc_id}, include=[])["ids"]
+        if ids:
+            self.vector_store.delete(ids=ids)
+        self.bm25.remove_document(doc_id)
+        self._invalidate_answers([doc_id])
+        self.documents.pop(doc_id, None)
+        logger.info(f"Removed document {doc_id} ({len(ids)} chunks).")
 
-    def ask(self, query: str, k: int = 5, score_threshold: float = 0.2):
+    def list_documents(self):
         """
-        Answer a query using the RAG pipeline.
+        Return the registry entries of all ingested documents.
+        """
+        return list(self.documents.values())
+
+    def _retrieve(self, query: str, k: int, score_threshold: float, doc_ids=None, query_vector=None,
+                  hybrid: bool = True, rerank: bool = False):
         """
-        if not self.vector_store:
+        Return the `k` chunks most relevant to `query`, optionally restricted to the documents in `doc_ids`.
+
+        Dense hits below `score_threshold` are dropped. With `hybrid`, BM25 keyword hits are fused
+        with the dense hits by reciprocal rank, which catches exact clause numbers and part codes.
+        With `rerank`, a local cross-encoder reorders the fused candidates before the top `k` are kept.
+        """
+        if not self.documents:
             raise ValueError("No vector store found. Please ingest a document first.")
 
-        if not self.retriever:
-            self.retriever = self.vector_store.as_retriever(
-                search_type="similarity_score_threshold",
-                search_kwargs={"k": k, "score_threshold": score_threshold},
+        logger.info(f"Retrieving context for query: {query}")
+        tracer = get_tracer()
+        if query_vector is None:
+            with tracer.span("pdf.embed_query"):
+                query_vector = self.embeddings.embed_query(query)
+        candidates = k * 3 if hybrid or rerank else k
+        collection = self.vector_store._collection
+        with tracer.span("pdf.dense_search", n_results=candidates):
+            dense = collection.query(
+                query_embeddings=[query_vector],
+                n_results=candidates,
+                where={"doc_id": {"$in": list(doc_ids)}} if doc_ids else None,
+                include=["documents", "metadatas", "distances"],
             )
+        relevance = self.vector_store._select_relevance_score_fn()
+        chunks = {}
+        dense_ranking = []
+        for chunk_id, text, metadata, distance in zip(
+            dense["ids"][0], dense["documents"][0], dense["metadatas"][0], dense["distances"][0]
+        ):
+            if relevance(distance) >= score_threshold:
+                chunks[chunk_id] = Document(page_content=text, metadata=metadata)
+                dense_ranking.append(chunk_id)
 
-        logger.info(f"Retrieving context for query: {query}")
-        retrieved_docs = self.retriever.invoke(query)
+        ranking = dense_ranking
+        if hybrid:
+            with tracer.span("pdf.bm25_search"):
+                sparse_ranking = [chunk_id for chunk_id, _ in self.bm25.search(query, candidates, doc_ids)]
+            ranking = reciprocal_rank_fusion([dense_ranking, sparse_ranking])[:candidates]
+            missing = [chunk_id for chunk_id in ranking if chunk_id not in chunks]
+            if missing:
+                fetched = collection.get(ids=missing, include=["documents", "metadatas"])
+                for chunk_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+                    chunks[chunk_id] = Document(page_content=text, metadata=metadata)
 
-        if not retrieved_docs:
-            return "No relevant context found in the document to answer your question."
+        docs = [chunks[chunk_id] for chunk_id in ranking if chunk_id in chunks]
+        reranker = get_reranker() if rerank else None
+        if reranker:
+            with tracer.span("pdf.rerank", candidates=len(docs)):
+                return reranker.rerank(query, docs, k)
+        return docs[:k]
+
+    def _selected_documents(self, doc_ids=None):
+        """Return the registered documents a question restricted to `doc_ids` (or to none) can draw on."""
+        return sorted(set(doc_ids) & self.documents.keys()) if doc_ids else sorted(self.documents)
+
+    def _cache_namespace(self, k: int, score_threshold: float, doc_ids=None, hybrid: bool = True, rerank: bool = False):
+        """Answers are only reused for the same documents, model, prompt and retrieval settings."""
+        return (fingerprint(self._selected_documents(doc_ids)), self.llm_model, PROMPT_VERSION, k, score_threshold,
+                hybrid, rerank, self.context_packer.token_budget)
 
-        formatted_input = {
-            "context": "\n\n".join(doc.page_content for doc in retrieved_docs),
-            "question": query,
-        }
+    def _build_input(self, query: str, retrieved_docs):
+        """Pack the retrieved chunks into the prompt input and return it with the packing stats."""
+        with get_tracer().span("pdf.pack_context") as span:
+            context, stats = self.context_packer.pack(retrieved_docs)
+            span.set(context_tokens=stats["context_tokens"], tokens_saved=stats["tokens_saved"])
+        self.last_context_stats = stats
+        return {"context": context, "question": query}, stats
 
-        # Build the RAG chain
-        chain = (
+    def _invalidate_answers(self, doc_ids):
+        """Forget the cached answers that drew on any of `doc_ids`."""
+        self.answer_cache.invalidate(list(doc_ids))
+
+    def _rag_chain(self):
+        """Build the RAG chain."""
+        return (
             RunnablePassthrough()  # Passes the input as-is
             | self.prompt           # Formats the input for the LLM
             | self.model            # Queries the LLM
             | StrOutputParser()     # Parses the LLM's output
         )
 
+    def _answer(self, query: str, query_vector, k: int, score_threshold: float, doc_ids=None,
+                debug: bool = False, hybrid: bool = True, rerank: bool = False, feature: str = "pdf_chat",
+                cancel_event=None):
+        """Answer one query whose embedding is already known and return the answer with its sources."""
+        tracer = get_tracer()
+        namespace = self._cache_namespace(k, score_threshold, doc_ids, hybrid, rerank)
+        with tracer.span("pdf.cache_lookup") as span:
+            cached = self.answer_cache.lookup(namespace, query_vector, query)
+            span.set(hit=cached is not None)
+        if cached is not None:
+            return {"answer": cached["answer"], "cached": True, "sources": cached["sources"], "context": None}
+
+        with tracer.span("pdf.retrieve", k=k, hybrid=hybrid, rerank=rerank):
+            retrieved_docs = self._retrieve(query, k, score_threshold, doc_ids, query_vector, hybrid, rerank)
+        if not retrieved_docs:
+            return {"answer": NO_CONTEXT_ANSWER, "cached": False, "sources": [], "context": None}
+        sources = _sources(retrieved_docs)
+
+        formatted_input, context_stats = self._build_input(query, retrieved_docs)
+
         logger.info("Generating response using the LLM.")
-        return chain.invoke(formatted_input)
+        started = time.perf_counter()
+        with tracer.span("pdf.generate", feature=feature) as span:
+            answer = get_gateway().call(
+                feature, self._rag_chain().invoke, formatted_input, config=debug_config(debug, span),
+                dedupe_key=(feature, namespace, query), cancel_event=cancel_event,
+            )
+        self.answer_cache.store(namespace, query, query_vector, answer, time.perf_counter() - started, sources,
+                                self._selected_documents(doc_ids))
+        return {"answer": answer, "cached": False, "sources": sources, "context": context_stats}
+
+    def ask(self, query: str, k: int = 5, score_threshold: float = 0.2, doc_ids=None, debug: bool = False,
+            hybrid: bool = True, rerank: bool = False, cancel_event=None):
+        """
+        Answer a query using the RAG pipeline, optionally restricted to the documents in `doc_ids`.
+        Answers to semantically equivalent earlier queries are served from the answer cache.
+        Set `debug` to print a LangChain trace of this call. Setting `cancel_event` gives up the
+        request, also while it is still queued in the LLM gateway.
+        """
+        if not self.documents:
+            raise ValueError("No vector store found. Please ingest a document first.")
+        with get_tracer().span("pdf.embed_query"):
+            query_vector = self.embeddings.embed_query(query)
+        return self._answer(query, query_vector, k, score_threshold, doc_ids, debug, hybrid, rerank,
+                            cancel_event=cancel_event)["answer"]
+
+    def ask_batch(self, queries, k: int = 5, score_threshold: float = 0.2, doc_ids=None, hybrid: bool = True,
+                  rerank: bool = False, max_workers: int = 4, on_result=None):
+        """
+        Answer many queries and return one result dict per query, in order.
+
+        All queries are embedded in a single batched call. Retrieval and generation then run on
+        `max_workers` threads, and generations go through the LLM gateway at batch priority so
+        interactive chat is served first. `on_result`, if given, is called with each result as it
+        completes. A failed query is reported in its result's `error` instead of failing the batch.
+        """
+        if not self.documents:
+            raise ValueError("No vector store found. Please ingest a document first.")
+        queries = list(queries)
+        if not queries:
+            return []
+        started = time.perf_counter()
+        with get_tracer().span("pdf.embed_queries", queries=len(queries)):
+            vectors = self.embeddings.embed_queries(queries)
+        logger.info(f"Embedded {len(queries)} queries in {time.perf_counter() - started:.2f}s.")
+
+        def run(index):
+            query_started = time.perf_counter()
+            try:
+                result = self._answer(queries[index], vectors[index], k, score_threshold, doc_ids,
+                                      hybrid=hybrid, rerank=rerank, feature="batch")
+            except Exception as e:
+                logger.error(f"Batch query {index} failed: {e}")
+                result = {"answer": None, "cached": False, "sources": [], "context": None, "error": str(e)}
+            result = {"index": index, "question": queries[index], **result,
+                      "latency": round(time.perf_counter() - query_started, 3)}
+            if on_result:
+                on_result(result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(run, range(len(queries))))
+        logger.info(f"Answered {len(queries)} queries in {time.perf_counter() - started:.2f}s.")
+        return results
+
+    def stream(self, query: str, k: int = 5, score_threshold: float = 0.2, doc_ids=None, debug: bool = False,
+               hybrid: bool = True, rerank: bool = False, cancel_event=None):
+        """
+        Like `ask`, but return a `TimedStream` of answer tokens as the LLM produces them.
+        """
+        if not self.documents:
+            raise ValueError("No vector store found. Please ingest a document first.")
+        namespace = self._cache_namespace(k, score_threshold, doc_ids, hybrid, rerank)
+        context = {}
+        tracer = get_tracer()
+
+        def tokens():
+            with tracer.span("pdf.embed_query"):
+                context["vector"] = query_vector = self.embeddings.embed_query(query)
+            with tracer.span("pdf.cache_lookup") as span:
+                cached = self.answer_cache.lookup(namespace, query_vector, query)
+                span.set(hit=cached is not None)
+            if cached is not None:
+                yield cached["answer"]
+                return
+            with tracer.span("pdf.retrieve", k=k, hybrid=hybrid, rerank=rerank):
+                retrieved_docs = self._retrieve(query, k, score_threshold, doc_ids, query_vector, hybrid, rerank)
+            if not retrieved_docs:
+                yield NO_CONTEXT_ANSWER
+                return
+            context["sources"] = _sources(retrieved_docs)
+            formatted_input, context_stats = self._build_input(query, retrieved_docs)
+            stream.extra["context_tokens"] = context_stats["context_tokens"]
+            stream.extra["tokens_saved"] = context_stats["tokens_saved"]
+            logger.info("Streaming response from the LLM.")
+            context["llm_started"] = time.perf_counter()
+            with tracer.span("pdf.generate", feature="pdf_chat") as span:
+                yield from first_token_timer(span, get_gateway().stream(
+                    "pdf_chat", lambda: self._rag_chain().stream(formatted_input, config=debug_config(debug, span)),
+                    cancel_event=cancel_event,
+                ))
+
+        def store(stream):
+            # Only complete, freshly generated answers are cached.
+            if stream.completed and "llm_started" in context:
+                llm_seconds = stream.finished_at - context["llm_started"]
+                self.answer_cache.store(namespace, query, context["vector"], stream.text, llm_seconds,
+                                        context["sources"], self._selected_documents(doc_ids))
+
+        stream = TimedStream(tokens(), label="chatpdf", on_complete=store)
+        return stream
+
+    def close(self):
+        """Delete this instance's private collection; shared collections are kept."""
+        if self._finalizer is not None:
+            self._finalizer()
 
     def clear(self):
         """
-        Reset the vector store and retriever.
+        Drop every document from the collection and reset the registry.
         """
-        logger.info("Clearing vector store and retriever.")
-        self.vector_store = None
-        self.retriever = None
+        logger.info("Clearing vector store and document registry.")
+        self.vector_store.delete_collection()
+        self.vector_store = self._open_collection()
+        self._invalidate_answers(self.documents)
+        self.bm25.clear()
+        self.documents = {}
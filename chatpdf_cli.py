@@ -0,0 +1,90 @@
+"""
+Run a file of questions against a folder of PDFs without the Streamlit UI.
+
+    python chatpdf_cli.py contracts/ checklist.txt --output answers.jsonl --workers 4
+
+The question file holds one question per line, or JSONL with a "question" field. Each answer
+is written to the output file as one JSON line as soon as it is ready, with its latency and
+retrieved sources.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+
+from chatpdf import ChatPDF
+from embedding_cache import file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+def read_questions(path: str):
+    """Read questions from a plain-text (one per line) or JSONL file, skipping blank lines."""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                line = json.loads(line)["question"]
+            questions.append(line)
+    return questions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a list of questions over a folder of PDFs.")
+    parser.add_argument("pdf_dir", help="Folder containing the PDFs to query")
+    parser.add_argument("questions", help="Question file (.txt, one per line, or .jsonl)")
+    parser.add_argument("--output", default="answers.jsonl", help="JSONL file to write results to")
+    parser.add_argument("--workers", type=int, default=4, help="Questions processed concurrently")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--collection", default="chatpdf-cli",
+                        help="Chroma collection to reuse, so unchanged PDFs are not re-ingested")
+    parser.add_argument("--no-hybrid", action="store_true", help="Use dense retrieval only")
+    parser.add_argument("--rerank", action="store_true", help="Rerank with a local cross-encoder")
+    parser.add_argument("--llm-model", default="deepseek-r1:latest")
+    parser.add_argument("--embedding-model", default="mxbai-embed-large")
+    args = parser.parse_args(argv)
+
+    pdfs = sorted(Path(args.pdf_dir).glob("*.pdf"))
+    if not pdfs:
+        parser.error(f"No PDFs found in {args.pdf_dir}")
+    questions = read_questions(args.questions)
+
+    assistant = ChatPDF(llm_model=args.llm_model, embedding_model=args.embedding_model,
+                        collection_name=args.collection)
+    files = [(str(path), file_sha256(str(path)), path.name) for path in pdfs]
+    wanted = {doc_id for _, doc_id, _ in files}
+    for doc_id in [doc_id for doc_id in assistant.documents if doc_id not in wanted]:
+        assistant.remove_document(doc_id)
+    assistant.add_documents(
+        files, on_progress=lambda stats: print(f"Ingesting: {stats.pages}/{stats.total_pages} pages", file=sys.stderr)
+    )
+
+    started = time.perf_counter()
+    lock = threading.Lock()
+    with open(args.output, "w", encoding="utf-8") as out:
+        def write(result):
+            with lock:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                print(f"[{result['index'] + 1}/{len(questions)}] {result['latency']:.2f}s {result['question']}",
+                      file=sys.stderr)
+
+        results = assistant.ask_batch(questions, k=args.k, score_threshold=args.threshold,
+                                      hybrid=not args.no_hybrid, rerank=args.rerank,
+                                      max_workers=args.workers, on_result=write)
+
+    failed = sum(1 for result in results if result.get("error"))
+    print(f"Answered {len(results) - failed}/{len(results)} questions in {time.perf_counter() - started:.1f}s; "
+          f"results in {args.output}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
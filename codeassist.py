@@ -1,31 +1,64 @@
 import streamlit as st
 from langchain_core.output_parsers import StrOutputParser
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import (SystemMessagePromptTemplate, HumanMessagePromptTemplate, 
-AIMessagePromptTemplate,ChatPromptTemplate)
-
-def create_system_prompt():
-    """Create the system prompt template."""
-    return SystemMessagePromptTemplate.from_template(
-        "You are an expert AI coding assistant. Provide concise, correct solutions "
-        "with strategic print statements for debugging. Always respond in English."
-    )
+from langchain_core.prompts import ChatPromptTemplate
+from conversation_memory import ConversationMemory, llm_summarizer
+from resources import debug_config, get_chat_model, get_gateway, get_tracer
+from streaming import TimedStream
+from tracing import first_token_timer
+
+SYSTEM_PROMPT = (
+    "You are an expert AI coding assistant. Provide concise, correct solutions "
+    "with strategic print statements for debugging. Always respond in English."
+)
 
-def build_prompt_chain():
-    """Build the prompt chain for the AI response."""
-    prompt_sequence = [create_system_prompt()]
-    for msg in st.session_state.code_messages:
-        if msg["role"] == "user":
-            prompt_sequence.append(HumanMessagePromptTemplate.from_template(msg["content"]))
-        elif msg["role"] == "ai":
-            prompt_sequence.append(AIMessagePromptTemplate.from_template(msg["content"]))
-    return ChatPromptTemplate.from_messages(prompt_sequence)
+def get_memory(token_budget=4096):
+    """Return this session's conversation memory, synced with the chat log."""
+    if "code_memory" not in st.session_state:
+        st.session_state.code_memory = ConversationMemory(
+            SYSTEM_PROMPT, llm_summarizer(create_llm_engine(), get_gateway()), token_budget=token_budget
+        )
+    memory = st.session_state.code_memory
+    memory.sync(st.session_state.code_messages)
+    return memory
+
+def build_prompt_chain(memory=None, cancel_event=None):
+    """Build the prompt chain for the AI response from the token-budgeted memory."""
+    memory = memory or get_memory()
+    # Messages are passed as literals so braces in pasted code are not treated as template variables.
+    return ChatPromptTemplate.from_messages(memory.messages(cancel_event))
 
 def create_llm_engine():
-    """Create and configure the LLM engine."""
-    return ChatOllama(model="deepseek-r1:latest", temperature=0.3)
+    """Return the shared, configured LLM engine."""
+    return get_chat_model("deepseek-r1:latest", temperature=0.3)
 
-def code_assistant():
+def code_assistant(cancel_event=None):
     """Generate an AI response using the prompt chain."""
-    processing_pipeline= build_prompt_chain() | create_llm_engine() | StrOutputParser()
-    return processing_pipeline.invoke({})
+    processing_pipeline= build_prompt_chain(cancel_event=cancel_event) | create_llm_engine() | StrOutputParser()
+    with get_tracer().span("code.generate") as span:
+        return get_gateway().call("code", processing_pipeline.invoke, {}, config=debug_config(span=span),
+                                  cancel_event=cancel_event)
+
+def stream_code_assistant(debug=False, cancel_event=None, memory=None):
+    """
+    Stream the AI response token by token as a `TimedStream`; `debug` traces this call and
+    setting `cancel_event` gives up the request, also while it waits in the LLM gateway.
+
+    Pass a `memory` taken from `get_memory()` to run the stream off the Streamlit script thread.
+    The prompt is only built once the stream is consumed, because fitting it to the token
+    budget may call the model to summarize older turns.
+    """
+    memory = memory or get_memory()
+
+    def tokens():
+        processing_pipeline = build_prompt_chain(memory, cancel_event) | create_llm_engine() | StrOutputParser()
+        with get_tracer().span("code.generate", prompt_tokens_estimate=memory.prompt_tokens()) as span:
+            yield from first_token_timer(span, get_gateway().stream(
+                "code", lambda: processing_pipeline.stream({}, config=debug_config(debug, span)),
+                cancel_event=cancel_event,
+            ))
+
+    return TimedStream(
+        tokens(),
+        label="code_assistant",
+        on_complete=lambda stream: memory.record_turn(**stream.stats()),
+    )
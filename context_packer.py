@@ -0,0 +1,144 @@
+import logging
+import re
+
+from conversation_memory import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+WORD = re.compile(r"\w+")
+
+
+def overlap_length(a: str, b: str, min_overlap: int, max_overlap: int) -> int:
+    """Return the length of the longest suffix of `a` that is also a prefix of `b`, or 0."""
+    for n in range(min(len(a), len(b), max_overlap), min_overlap - 1, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+
+def shingles(text: str, size: int = 5):
+    """Return the set of `size`-word shingles of `text`."""
+    words = WORD.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def coverage(candidate: set, kept: set) -> float:
+    """Share of `candidate` already found in `kept`; a long block merely containing a kept chunk scores low."""
+    return len(candidate & kept) / len(candidate) if candidate else 0.0
+
+
+def citation(block) -> str:
+    return f"[{block['source'] or 'document'}, p. {block['page'] + 1}]"
+
+
+class ContextPacker:
+    """
+    Assemble retrieved chunks into the context of a RAG prompt.
+
+    Chunks are expected in relevance order. Overlapping chunks from the same page are stitched
+    back together, near-duplicates (blocks with at least `dedupe_threshold` of their own word
+    shingles already in more relevant blocks) are dropped, and the remaining blocks are packed
+    into `token_budget` tokens, most relevant first, each headed by its source and page.
+    """
+
+    def __init__(self, token_budget: int = 1500, dedupe_threshold: float = 0.8, min_overlap: int = 20,
+                 max_overlap: int = 400, shingle_size: int = 5):
+        self.token_budget = token_budget
+        self.dedupe_threshold = dedupe_threshold
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self.shingle_size = shingle_size
+
+    def _merge(self, block, text):
+        """Stitch `text` into `block` if they overlap or one contains the other; return True if merged."""
+        current = block["text"]
+        if text in current:
+            return True
+        if current in text:
+            block["text"] = text
+            return True
+        n = overlap_length(current, text, self.min_overlap, self.max_overlap)
+        if n:
+            block["text"] = current + text[n:]
+            return True
+        n = overlap_length(text, current, self.min_overlap, self.max_overlap)
+        if n:
+            block["text"] = text + current[n:]
+            return True
+        return False
+
+    def _stitch(self, docs):
+        blocks = []
+        for rank, doc in enumerate(docs):
+            metadata = doc.metadata or {}
+            block = {
+                "doc_id": metadata.get("doc_id"),
+                "source": metadata.get("source"),
+                "page": int(metadata.get("page") or 0),
+                "rank": rank,
+                "text": doc.page_content,
+            }
+            # A merge can make a block overlap another one from the same page, so keep folding.
+            merged = True
+            while merged:
+                merged = False
+                for other in blocks:
+                    if (other["doc_id"], other["page"]) == (block["doc_id"], block["page"]) \
+                            and self._merge(other, block["text"]):
+                        blocks.remove(other)
+                        other["rank"] = min(other["rank"], block["rank"])
+                        block = other
+                        merged = True
+                        break
+            blocks.append(block)
+        return sorted(blocks, key=lambda b: b["rank"])
+
+    def _dedupe(self, blocks):
+        kept, seen = [], set()
+        for block in blocks:
+            block_shingles = shingles(block["text"], self.shingle_size)
+            if coverage(block_shingles, seen) >= self.dedupe_threshold:
+                continue
+            kept.append(block)
+            seen |= block_shingles
+        return kept
+
+    def pack(self, docs):
+        """Return `(context, stats)` for chunks given in relevance order."""
+        raw_tokens = estimate_tokens("\n\n".join(doc.page_content for doc in docs)) if docs else 0
+        stitched = self._stitch(docs)
+        blocks = self._dedupe(stitched)
+
+        parts, sources, used, over_budget = [], [], 0, 0
+        for block in blocks:
+            part = f"{citation(block)}\n{block['text']}"
+            tokens = estimate_tokens(part)
+            if used + tokens > self.token_budget:
+                if parts:
+                    over_budget += 1
+                    continue
+                # Always keep the most relevant block, cut down to the budget.
+                part = part[:self.token_budget * 4]
+                tokens = estimate_tokens(part)
+            parts.append(part)
+            sources.append(citation(block))
+            used += tokens
+
+        context = "\n\n".join(parts)
+        packed_tokens = estimate_tokens(context) if context else 0
+        stats = {
+            "chunks": len(docs),
+            "merged": len(docs) - len(stitched),
+            "duplicates": len(stitched) - len(blocks),
+            "over_budget": over_budget,
+            "blocks": len(parts),
+            "raw_tokens": raw_tokens,
+            "context_tokens": packed_tokens,
+            "tokens_saved": max(0, raw_tokens - packed_tokens),
+            "sources": sources,
+        }
+        logger.info(f"Packed {stats['chunks']} chunks into {stats['blocks']} blocks, "
+                    f"{packed_tokens} tokens ({stats['tokens_saved']} saved)")
+        return context, stats
@@ -0,0 +1,136 @@
+import logging
+import re
+from functools import partial
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+logger = logging.getLogger(__name__)
+
+THINK_BLOCK = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+
+def strip_reasoning(text: str) -> str:
+    """Remove deepseek-r1 style `<think>` blocks from a model reply."""
+    return THINK_BLOCK.sub("", text).strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheaply estimate the token count of `text` (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def llm_summarizer(llm, gateway=None):
+    """
+    Return a summarizer that folds new turns into an existing summary with `llm`.
+    Only the turns being folded are sent, never the whole history. Calls go through
+    `gateway` when one is given, and give up there once `cancel_event` is set.
+    """
+    def summarize(summary, turns, cancel_event=None):
+        transcript = "\n".join(f"{role.upper()}: {content}" for role, content in turns)
+        invoke = partial(gateway.call, "code", llm.invoke, cancel_event=cancel_event) if gateway else llm.invoke
+        response = invoke([
+            SystemMessage(content=(
+                "You maintain a running summary of a programming conversation. Merge the new turns into "
+                "the summary. Keep code identifiers, file names, errors and decisions. Reply with the "
+                "updated summary only, in under 200 words."
+            )),
+            HumanMessage(content=f"Current summary:\n{summary or '(empty)'}\n\nNew turns:\n{transcript}"),
+        ])
+        return strip_reasoning(response.content)
+    return summarize
+
+
+class ConversationMemory:
+    """
+    A token-budgeted conversation memory.
+
+    The prompt is laid out as: system prompt, rolling summary of older turns, recent turns
+    verbatim. When the prompt exceeds `token_budget`, the oldest turns are folded into the
+    summary until it is back under `low_watermark` of the budget. Folding in one large step
+    rather than one turn per question means the prompt prefix stays byte-identical across most
+    turns, which lets Ollama reuse its KV cache for everything but the newest messages.
+    """
+
+    def __init__(self, system_prompt: str, summarizer, token_budget: int = 4096,
+                 low_watermark: float = 0.6, min_recent_turns: int = 2):
+        self.system_prompt = system_prompt
+        self.summarizer = summarizer
+        self.token_budget = token_budget
+        self.low_watermark = low_watermark
+        self.min_recent_turns = min_recent_turns
+        self.turns = []
+        self.summary = ""
+        self.folded = 0
+        self.turn_stats = []
+
+    def sync(self, messages):
+        """
+        Append any `{"role", "content"}` messages not yet seen; reset if the history was cleared.
+        Reasoning blocks are dropped from assistant replies so they are not sent back to the model.
+        """
+        if len(messages) < len(self.turns):
+            self.clear()
+        for msg in messages[len(self.turns):]:
+            content = msg["content"] if msg["role"] == "user" else strip_reasoning(msg["content"])
+            self.turns.append((msg["role"], content))
+
+    def clear(self):
+        """Forget all turns and the summary."""
+        self.turns = []
+        self.summary = ""
+        self.folded = 0
+        self.turn_stats = []
+
+    def _summary_message(self):
+        return SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}")
+
+    def prompt_tokens(self):
+        """Estimate the token size of the prompt that `messages()` would build."""
+        tokens = estimate_tokens(self.system_prompt)
+        if self.summary:
+            tokens += estimate_tokens(self._summary_message().content)
+        return tokens + sum(estimate_tokens(content) for _, content in self.turns[self.folded:])
+
+    def fit(self, cancel_event=None):
+        """
+        Fold the oldest verbatim turns into the summary if the prompt is over budget.
+        This may call the model, so keep it off the UI thread.
+        """
+        if self.prompt_tokens() <= self.token_budget:
+            return
+        target = self.token_budget * self.low_watermark
+        end = self.folded
+        last_foldable = len(self.turns) - self.min_recent_turns
+        tokens = self.prompt_tokens()
+        while end < last_foldable and tokens > target:
+            tokens -= estimate_tokens(self.turns[end][1])
+            end += 1
+        if end == self.folded:
+            return
+        logger.info(f"Folding turns {self.folded}-{end - 1} into the conversation summary.")
+        self.summary = self.summarizer(self.summary, self.turns[self.folded:end], cancel_event=cancel_event)
+        self.folded = end
+
+    def messages(self, cancel_event=None):
+        """Return the chat messages for the next model call, fitted to the token budget."""
+        self.fit(cancel_event)
+        messages = [SystemMessage(content=self.system_prompt)]
+        if self.summary:
+            messages.append(self._summary_message())
+        for role, content in self.turns[self.folded:]:
+            messages.append(HumanMessage(content=content) if role == "user" else AIMessage(content=content))
+        return messages
+
+    def record_turn(self, **stats):
+        """Store latency and token stats for the turn just answered and return them."""
+        entry = {
+            "turn": len(self.turn_stats) + 1,
+            "prompt_tokens": self.prompt_tokens(),
+            "summary_tokens": estimate_tokens(self.summary) if self.summary else 0,
+            "verbatim_turns": len(self.turns) - self.folded,
+            "folded_turns": self.folded,
+            **stats,
+        }
+        self.turn_stats.append(entry)
+        logger.info(f"Conversation turn stats: {entry}")
+        return entry
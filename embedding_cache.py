@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "embedding_cache.db"
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Return the hex SHA-256 digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """A persistent, size-bounded LRU store of embedding vectors backed by SQLite."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 200_000):
+        """
+        Open (or create) the cache database at `path`, keeping at most `max_entries` vectors.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def get_many(self, keys):
+        """
+        Return a dict mapping each cached key to its vector, refreshing its LRU position.
+        """
+        found = {}
+        if not keys:
+            return found
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items):
+        """
+        Store `(key, vector)` pairs and evict the least recently used entries over the size bound.
+        """
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                logger.info(f"Evicted {count - self.max_entries} embeddings from cache.")
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Return hit/miss counters and the current number of cached vectors.
+        """
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": size,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        """Close the underlying database connection."""
+        self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """An `Embeddings` wrapper that serves document vectors from an `EmbeddingCache`."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str, namespace: str = ""):
+        """
+        Wrap `embeddings`; cache keys combine `model_name`, `namespace` (e.g. splitter settings) and the text.
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+        self.namespace = namespace
+
+    def key_for(self, text: str) -> str:
+        """Return the content-addressed cache key for a chunk of text."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}|{self.namespace}|{digest}"
+
+    def embed_documents(self, texts):
+        """
+        Embed `texts`, calling the underlying model only for chunks not already cached.
+        """
+        keys = [self.key_for(text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            logger.info(f"Embedding {len(missing)} of {len(texts)} chunks ({len(texts) - len(missing)} cached).")
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(fresh.items())
+            cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str):
+        """Embed a query; queries are not cached."""
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts):
+        """Embed several queries in one uncached batch call."""
+        return self.embeddings.embed_documents(list(texts))
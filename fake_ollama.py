@@ -0,0 +1,200 @@
+"""
+A deterministic local stand-in for the Ollama HTTP API, for tests and benchmarks.
+
+    python fake_ollama.py --port 11435 --prefill-ms 200 --tokens-per-sec 40
+    OLLAMA_HOST=http://127.0.0.1:11435 streamlit run app.py
+
+It implements /api/chat, /api/generate, /api/embed, /api/embeddings, /api/tags and
+/api/version. Replies and embeddings are derived from a hash of the request, and the
+configured prefill delay and decode rate simulate model latency.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("the", "model", "answer", "document", "vehicle", "summary", "section", "value", "code",
+         "result", "clause", "speed", "notice", "period", "function", "data", "returns", "is")
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def fake_embedding(text: str, dimensions: int = 256):
+    """Return a deterministic unit vector for `text`."""
+    rng = random.Random(_seed(text))
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector]
+
+
+def fake_reply(prompt: str, tokens: int):
+    """Return a deterministic list of reply tokens for a prompt."""
+    rng = random.Random(_seed(prompt))
+    return [(" " if i else "") + rng.choice(WORDS) for i in range(tokens)]
+
+
+class FakeOllamaServer:
+    """
+    A threaded fake Ollama server.
+
+    `prefill_seconds` is slept before the first token (plus `prefill_per_1k_chars` per 1,000
+    prompt characters), and tokens are then emitted at `tokens_per_second`.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, prefill_seconds: float = 0.05,
+                 prefill_per_1k_chars: float = 0.0, tokens_per_second: float = 200.0,
+                 reply_tokens: int = 32, embedding_dimensions: int = 256, embedding_seconds: float = 0.0):
+        self.prefill_seconds = prefill_seconds
+        self.prefill_per_1k_chars = prefill_per_1k_chars
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.embedding_dimensions = embedding_dimensions
+        self.embedding_seconds = embedding_seconds
+        self.requests = 0
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": []})
+                elif self.path == "/api/version":
+                    self._send_json({"version": "0.0.0-fake"})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                server.requests += 1
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path in ("/api/chat", "/api/generate"):
+                    self._generate(request, chat=self.path == "/api/chat")
+                elif self.path == "/api/embed":
+                    inputs = request.get("input", "")
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    time.sleep(server.embedding_seconds * len(inputs))
+                    embeddings = [fake_embedding(text, server.embedding_dimensions) for text in inputs]
+                    self._send_json({"model": request.get("model"), "embeddings": embeddings})
+                elif self.path == "/api/embeddings":
+                    time.sleep(server.embedding_seconds)
+                    self._send_json({"embedding": fake_embedding(request.get("prompt", ""), server.embedding_dimensions)})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def _generate(self, request, chat):
+                if chat:
+                    prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+                else:
+                    prompt = request.get("prompt", "")
+                tokens = fake_reply(prompt, server.reply_tokens)
+                prefill = server.prefill_seconds + server.prefill_per_1k_chars * len(prompt) / 1000
+                decode = len(tokens) / server.tokens_per_second
+                stats = {
+                    "done": True,
+                    "done_reason": "stop",
+                    "total_duration": int((prefill + decode) * 1e9),
+                    "load_duration": 0,
+                    "prompt_eval_count": max(1, len(prompt) // 4),
+                    "prompt_eval_duration": int(prefill * 1e9),
+                    "eval_count": len(tokens),
+                    "eval_duration": int(decode * 1e9),
+                }
+
+                def chunk(text, done=False):
+                    payload = {"model": request.get("model"), "created_at": datetime.now(timezone.utc).isoformat(),
+                               "done": done}
+                    if chat:
+                        payload["message"] = {"role": "assistant", "content": text}
+                    else:
+                        payload["response"] = text
+                    return {**payload, **stats} if done else payload
+
+                time.sleep(prefill)
+                if not request.get("stream", True):
+                    time.sleep(decode)
+                    self._send_json(chunk("".join(tokens), done=True))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in tokens:
+                    time.sleep(1 / server.tokens_per_second)
+                    self._write_chunk(chunk(token))
+                self._write_chunk(chunk("", done=True))
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, payload):
+                line = json.dumps(payload).encode("utf-8") + b"\n"
+                self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--prefill-ms", type=float, default=50)
+    parser.add_argument("--tokens-per-sec", type=float, default=200)
+    parser.add_argument("--reply-tokens", type=int, default=32)
+    parser.add_argument("--embedding-dimensions", type=int, default=256)
+    args = parser.parse_args()
+    server = FakeOllamaServer(args.host, args.port, prefill_seconds=args.prefill_ms / 1000,
+                              tokens_per_second=args.tokens_per_sec, reply_tokens=args.reply_tokens,
+                              embedding_dimensions=args.embedding_dimensions)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
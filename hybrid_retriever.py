@@ -0,0 +1,128 @@
+import logging
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Keep dotted and hyphenated identifiers such as clause "12.3.1" or part code "AB-1234" whole.
+TOKEN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+
+def tokenize(text: str):
+    return TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    An in-process BM25 inverted index over chunk IDs.
+
+    Only term statistics are held in memory; chunk text stays in the vector store.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)
+        self.lengths = {}
+        self.chunk_docs = {}
+        self.chunk_terms = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, chunk_ids, doc_ids, texts):
+        """Index chunks, replacing any chunk already indexed under the same ID."""
+        with self._lock:
+            for chunk_id, doc_id, text in zip(chunk_ids, doc_ids, texts):
+                if chunk_id in self.lengths:
+                    self._remove_chunk(chunk_id)
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    self.postings[term][chunk_id] = tf
+                self.chunk_terms[chunk_id] = list(counts)
+                self.lengths[chunk_id] = sum(counts.values())
+                self.chunk_docs[chunk_id] = doc_id
+                self.total_length += self.lengths[chunk_id]
+
+    def _remove_chunk(self, chunk_id):
+        for term in self.chunk_terms.pop(chunk_id):
+            posting = self.postings[term]
+            posting.pop(chunk_id, None)
+            if not posting:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(chunk_id)
+        del self.chunk_docs[chunk_id]
+
+    def remove_document(self, doc_id):
+        with self._lock:
+            for chunk_id in [c for c, d in self.chunk_docs.items() if d == doc_id]:
+                self._remove_chunk(chunk_id)
+
+    def clear(self):
+        with self._lock:
+            self.__init__(self.k1, self.b)
+
+    def search(self, query: str, k: int, doc_ids=None):
+        """Return up to `k` `(chunk_id, score)` pairs, best first."""
+        with self._lock:
+            n = len(self.lengths)
+            if not n:
+                return []
+            avg_length = self.total_length / n
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for chunk_id, tf in posting.items():
+                    if doc_ids and self.chunk_docs[chunk_id] not in doc_ids:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / avg_length)
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """Fuse ranked lists of IDs; each list contributes 1 / (k + rank) per ID."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class CrossEncoderReranker:
+    """Rerank chunks with a small local cross-encoder (requires sentence-transformers)."""
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name)
+
+    def rerank(self, query: str, docs, k: int):
+        if not docs:
+            return docs
+        scores = self.model.predict([(query, doc.page_content) for doc in docs])
+        ranked = sorted(zip(scores, range(len(docs))), reverse=True)[:k]
+        return [docs[i] for _, i in ranked]
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """Return the shared cross-encoder reranker, or None if sentence-transformers is not installed."""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            try:
+                _reranker = CrossEncoderReranker()
+            except ImportError:
+                logger.warning("Reranking requested but sentence-transformers is not installed; skipping.")
+                _reranker = False
+    return _reranker or None
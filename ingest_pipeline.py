@@ -0,0 +1,229 @@
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pypdf import PdfReader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+logger = logging.getLogger(__name__)
+
+
+def open_pdf(pdf):
+    """Open a PDF given as a file path or as in-memory bytes."""
+    return PdfReader(io.BytesIO(pdf) if isinstance(pdf, (bytes, bytearray)) else pdf)
+
+
+def parse_pages(pdf, start: int, end: int, chunk_size: int, chunk_overlap: int, reader=None):
+    """
+    Extract and split pages [start, end) of a PDF given as a path or bytes, reusing `reader` if
+    it is already open. Returns picklable `(page, text)` tuples so this can run in a worker process.
+    """
+    reader = reader or open_pdf(pdf)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = []
+    for page in range(start, end):
+        text = reader.pages[page].extract_text() or ""
+        chunks.extend((page, piece) for piece in splitter.split_text(text))
+    return chunks
+
+
+# Readers opened by this worker process. Opening a PDF and reaching its pages costs time in
+# proportion to the whole file, so each worker opens a file once rather than once per task.
+_worker_readers = OrderedDict()
+WORKER_READERS = 4
+
+
+def _parse_in_worker(path, start: int, end: int, chunk_size: int, chunk_overlap: int):
+    reader = _worker_readers.get(path)
+    if reader is None:
+        reader = _worker_readers[path] = open_pdf(path)
+        while len(_worker_readers) > WORKER_READERS:
+            _worker_readers.popitem(last=False)
+    _worker_readers.move_to_end(path)
+    return parse_pages(path, start, end, chunk_size, chunk_overlap, reader)
+
+
+def _spill(pdf, paths):
+    """Return a path for `pdf`, writing in-memory bytes to a temp file (recorded in `paths`) once."""
+    if not isinstance(pdf, (bytes, bytearray)):
+        return pdf
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(pdf)
+    paths.append(f.name)
+    return f.name
+
+
+def _process_context():
+    """
+    Start workers from a fresh server process rather than forking the caller, which may be a
+    Streamlit or job thread holding locks that a forked child would inherit.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class IngestStats:
+    """Running counters for an ingestion run."""
+
+    def __init__(self, total_pages: int = 0):
+        self.total_pages = total_pages
+        self.pages = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def pages_per_sec(self):
+        return self.pages / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chunks_per_sec(self):
+        return self.chunks / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "total_pages": self.total_pages,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "elapsed": round(self.elapsed, 3),
+            "pages_per_sec": round(self.pages_per_sec, 2),
+            "chunks_per_sec": round(self.chunks_per_sec, 2),
+        }
+
+
+class IngestionPipeline:
+    """
+    A streaming PDF ingestion pipeline.
+
+    Page ranges are parsed and split in a process pool, chunks are embedded in batches on a
+    thread pool, and each embedded batch is handed to `sink(ids, texts, metadatas, vectors)` for a
+    bulk write. Only a bounded window of page ranges and batches is in flight at any time, so
+    memory does not grow with the size of the PDF.
+    """
+
+    def __init__(self, embeddings, sink, chunk_size: int = 1024, chunk_overlap: int = 100,
+                 pages_per_task: int = 16, parse_workers: int = None, batch_size: int = 64,
+                 embed_concurrency: int = 2, on_progress=None):
+        self.embeddings = embeddings
+        self.sink = sink
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.pages_per_task = pages_per_task
+        self.parse_workers = parse_workers or min(4, os.cpu_count() or 1)
+        self.batch_size = batch_size
+        self.embed_concurrency = embed_concurrency
+        self.on_progress = on_progress
+
+    def _tasks(self, files, page_counts):
+        """Yield `(path, doc_id, source, start, end)` page ranges, interleaving the files."""
+        ranges = []
+        for path, doc_id, source in files:
+            pages = page_counts[doc_id]
+            ranges.append(deque(
+                (path, doc_id, source, start, min(start + self.pages_per_task, pages))
+                for start in range(0, pages, self.pages_per_task)
+            ))
+        while any(ranges):
+            for queue in ranges:
+                if queue:
+                    yield queue.popleft()
+
+    def run(self, files):
+        """
+        Ingest `(path, doc_id, source)` triples and return `(per-document chunk counts, IngestStats)`.
+        `path` may also be the PDF's bytes, e.g. straight from an upload. When pages are parsed in
+        worker processes, such bytes are written to a temp file once, deleted afterwards, so the
+        workers get a path instead of a copy of the PDF with every task.
+        """
+        files = list(files)
+        readers = {doc_id: open_pdf(path) for path, doc_id, _ in files}
+        page_counts = {doc_id: reader.get_num_pages() for doc_id, reader in readers.items()}
+        stats = IngestStats(sum(page_counts.values()))
+        counts = {doc_id: 0 for _, doc_id, _ in files}
+
+        # Small inputs are not worth the cost of spawning worker processes.
+        use_processes = stats.total_pages > self.pages_per_task
+        parse_pool, spilled = None, []
+        embed_pool = ThreadPoolExecutor(self.embed_concurrency)
+        parsing, embedding = deque(), deque()
+        batch = []
+
+        def submit_parse():
+            task = next(tasks, None)
+            if task is None:
+                return False
+            path, doc_id, _, start, end = task
+            args = (path, start, end, self.chunk_size, self.chunk_overlap)
+            if parse_pool:
+                future = parse_pool.submit(_parse_in_worker, *args)
+            else:
+                future = _Done(parse_pages(*args, reader=readers[doc_id]))
+            parsing.append((task, future))
+            return True
+
+        def flush(wait_all=False):
+            while embedding and (wait_all or len(embedding) >= self.embed_concurrency * 2):
+                items, future = embedding.popleft()
+                ids, texts, metadatas = zip(*items)
+                self.sink(list(ids), list(texts), list(metadatas), future.result())
+                stats.chunks += len(items)
+                if self.on_progress:
+                    self.on_progress(stats)
+
+        def submit_embed():
+            items = batch[:]
+            batch.clear()
+            texts = [text for _, text, _ in items]
+            embedding.append((items, embed_pool.submit(self.embeddings.embed_documents, texts)))
+            flush()
+
+        try:
+            if use_processes:
+                files = [(_spill(path, spilled), doc_id, source) for path, doc_id, source in files]
+                parse_pool = ProcessPoolExecutor(self.parse_workers, mp_context=_process_context())
+                # Workers open their own readers.
+                readers.clear()
+            tasks = self._tasks(files, page_counts)
+            for _ in range(self.parse_workers * 2):
+                if not submit_parse():
+                    break
+            while parsing:
+                (path, doc_id, source, start, end), future = parsing.popleft()
+                submit_parse()
+                for i, (page, text) in enumerate(future.result()):
+                    metadata = {"doc_id": doc_id, "source": source, "page": page}
+                    batch.append((f"{doc_id}-{page}-{i}", text, metadata))
+                    counts[doc_id] += 1
+                    if len(batch) >= self.batch_size:
+                        submit_embed()
+                stats.pages += end - start
+            if batch:
+                submit_embed()
+            flush(wait_all=True)
+        finally:
+            embed_pool.shutdown(cancel_futures=True)
+            if parse_pool:
+                parse_pool.shutdown(cancel_futures=True)
+            for path in spilled:
+                os.remove(path)
+
+        logger.info(f"Ingested {stats.pages} pages into {stats.chunks} chunks: {stats.as_dict()}")
+        return counts, stats
+
+
+class _Done:
+    """A stand-in for an already completed future."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
@@ -0,0 +1,234 @@
+"""
+Background jobs for the Streamlit pages.
+
+Ingestion and generation run on a shared worker pool instead of the Streamlit script thread,
+so a page keeps responding while they run. Each job has an ID, a progress fraction and status
+message for the page to poll, and a cancel flag. A free worker goes to the owner (one per
+browser session) with the fewest running jobs, so one user's backlog does not hold every
+worker while another user waits. Jobs must not touch `st.session_state`; the page moves a
+finished job's result into session state when it polls.
+"""
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled."""
+
+
+class Job:
+    """
+    One unit of background work. The job function receives the `Job` as its first argument and
+    reports through `update`, which raises `JobCancelled` once the job has been cancelled.
+    """
+
+    def __init__(self, fn, args, kwargs, kind: str, name: str, owner: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.kind = kind
+        self.name = name
+        self.owner = owner
+        self.status = QUEUED
+        self.progress = None
+        self.message = ""
+        self.partial = ""
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    @property
+    def elapsed(self):
+        """Seconds the job has been running (so far, if still running)."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def check(self):
+        """Raise `JobCancelled` if the job has been cancelled."""
+        if self.cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} ({self.name}) was cancelled")
+
+    def update(self, progress: float = None, message: str = None):
+        """Report progress (0-1) and/or a status message, and stop here if the job was cancelled."""
+        if progress is not None:
+            self.progress = min(1.0, max(0.0, progress))
+        if message is not None:
+            self.message = message
+        self.check()
+
+    def stream(self, tokens):
+        """
+        Consume a token iterator into `partial` so the page can show it as it grows, and return
+        the full text. On cancellation the iterator is closed, which releases its model slot.
+        """
+        iterator = iter(tokens)
+        try:
+            for token in iterator:
+                self.partial += token
+                self.check()
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+        return self.partial
+
+
+class JobManager:
+    """
+    Run jobs on at most `max_workers` threads.
+
+    Each owner has its own FIFO queue. A free worker takes the next job of the waiting owner
+    with the fewest running jobs; on a tie, the owner served longest ago goes first. Finished
+    jobs are kept until they are `remove`d, up to `keep_finished` of them.
+    """
+
+    def __init__(self, max_workers: int = 4, keep_finished: int = 200):
+        self.max_workers = max_workers
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._queues = OrderedDict()
+        self._running = 0
+        self._running_by_owner = Counter()
+        self._served = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, kind: str = "job", name: str = None, owner: str = "", **kwargs) -> Job:
+        """Queue `fn(job, *args, **kwargs)` and return its `Job`."""
+        job = Job(fn, args, kwargs, kind, name or kind, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._queues.setdefault(owner, deque()).append(job)
+            self._prune()
+            self._dispatch()
+        logger.info(f"Queued job {job.id} ({kind}: {job.name}) for {owner or 'anonymous'}.")
+        return job
+
+    def _dispatch(self):
+        """Start queued jobs on free workers, least-served owner first. Call with the lock held."""
+        while self._running < self.max_workers and self._queues:
+            owner = min(self._queues,
+                        key=lambda name: (self._running_by_owner[name], self._served.get(name, -1)))
+            queue = self._queues.pop(owner)
+            job = queue.popleft()
+            if queue:
+                self._queues[owner] = queue
+            self._running += 1
+            self._running_by_owner[owner] += 1
+            self._served[owner] = next(self._seq)
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._executor.submit(self._run, job)
+
+    def _run(self, job: Job):
+        try:
+            job.check()
+            job.result = job.fn(job, *job.args, **job.kwargs)
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            if job.cancelled:
+                # Code that takes the cancel event (e.g. the LLM gateway) raises its own error type.
+                job.status = CANCELLED
+            else:
+                logger.exception(f"Job {job.id} ({job.kind}: {job.name}) failed.")
+                job.error = e
+                job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            logger.info(f"Job {job.id} ({job.kind}: {job.name}) {job.status} after {job.elapsed:.2f}s.")
+            with self._lock:
+                self._running -= 1
+                self._running_by_owner[job.owner] -= 1
+                if not self._running_by_owner[job.owner]:
+                    del self._running_by_owner[job.owner]
+                    if job.owner not in self._queues:
+                        self._served.pop(job.owner, None)
+                self._dispatch()
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond `keep_finished`. Call with the lock held."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def jobs(self, owner: str = None, kind: str = None):
+        """Return the known jobs, oldest first, optionally only one owner's or one kind's."""
+        with self._lock:
+            return [job for job in self._jobs.values()
+                    if (owner is None or job.owner == owner) and (kind is None or job.kind == kind)]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job: a queued job is dropped at once, a running one stops at its next `update`
+        or as soon as code watching its `cancel_event` notices. Returns False if the job is
+        unknown or already finished.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.cancel_event.set()
+            queue = self._queues.get(job.owner)
+            if job.status == QUEUED and queue is not None:
+                queue.remove(job)
+                if not queue:
+                    del self._queues[job.owner]
+                    if not self._running_by_owner[job.owner]:
+                        self._served.pop(job.owner, None)
+                job.status = CANCELLED
+                job.finished_at = time.time()
+        logger.info(f"Cancelled job {job_id} ({job.kind}: {job.name}).")
+        return True
+
+    def remove(self, job_id: str):
+        """Forget a finished job once its result has been collected."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.finished:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING, *FINISHED)}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {**counts, "max_workers": self.max_workers, "owners_waiting": len(self._queues)}
+
+    def shutdown(self, cancel: bool = True):
+        """Stop the workers, cancelling outstanding jobs unless `cancel` is False (then wait for them)."""
+        for job in self.jobs():
+            if cancel:
+                self.cancel(job.id)
+            else:
+                while not job.finished:
+                    time.sleep(0.01)
+        self._executor.shutdown(wait=True)
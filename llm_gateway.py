@@ -0,0 +1,206 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, wait
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers are served first. Interactive chat goes ahead of batch summarization.
+DEFAULT_PRIORITIES = {
+    "pdf_chat": 0,
+    "code": 0,
+    "sql": 0,
+    "summary": 10,
+    "batch": 20,
+}
+
+
+# Handed to callers waiting on a shared request whose caller gave up, so one of them runs it.
+_RETRY = object()
+
+
+class GatewayTimeout(TimeoutError):
+    """A request waited longer than its timeout for the model."""
+
+
+class RequestCancelled(Exception):
+    """A request was cancelled before it completed."""
+
+
+class LLMGateway:
+    """
+    A scheduler in front of the local LLM.
+
+    At most `max_concurrency` requests run against the model at once. Waiting requests are
+    served by feature priority and then in arrival order. Identical in-flight `call`s that
+    share a `dedupe_key` wait for the same result instead of reaching the model twice; if the
+    caller running it is cancelled or times out, a waiting caller runs it instead. Requests can
+    time out while queued and can be cancelled through a `threading.Event`.
+    A stream holds its slot until it is exhausted or closed, so a Streamlit rerun that
+    abandons a stream gives the slot back.
+    """
+
+    def __init__(self, max_concurrency: int = 2, priorities=None, default_timeout: float = 600.0):
+        self.max_concurrency = max_concurrency
+        self.priorities = {**DEFAULT_PRIORITIES, **(priorities or {})}
+        self.default_timeout = default_timeout
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._in_flight = {}
+        self._waits = defaultdict(lambda: deque(maxlen=1000))
+        self._counters = defaultdict(int)
+
+    def _acquire(self, feature: str, timeout: float, cancel_event: threading.Event = None):
+        """Block until this request may run and return the seconds it waited."""
+        ticket = (self.priorities.get(feature, 0), next(self._seq), feature)
+        started = time.perf_counter()
+        deadline = started + timeout
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while self._active >= self.max_concurrency or self._queue[0] is not ticket:
+                    if cancel_event is not None and cancel_event.is_set():
+                        self._counters["cancelled"] += 1
+                        raise RequestCancelled(f"{feature} request cancelled while queued")
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise GatewayTimeout(f"{feature} request waited more than {timeout:g}s for the model")
+                    # Poll when cancellable so a cancelled request does not wait for the next release.
+                    self._cond.wait(min(remaining, 0.1) if cancel_event is not None else remaining)
+            except BaseException:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._queue)
+            self._active += 1
+            # Another waiter may be next in line for a free slot.
+            self._cond.notify_all()
+            waited = time.perf_counter() - started
+            self._waits[feature].append(waited)
+            self._counters[f"requests.{feature}"] += 1
+        return waited
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def call(self, feature: str, fn, *args, dedupe_key=None, timeout: float = None,
+             cancel_event: threading.Event = None, **kwargs):
+        """
+        Run `fn(*args, **kwargs)` once a model slot is free and return its result.
+        """
+        timeout = timeout or self.default_timeout
+        if dedupe_key is None:
+            return self._run(feature, fn, args, kwargs, timeout, cancel_event)
+        deadline = time.perf_counter() + timeout
+        while True:
+            with self._cond:
+                future = self._in_flight.get(dedupe_key)
+                owner = future is None
+                if owner:
+                    future = self._in_flight[dedupe_key] = Future()
+                else:
+                    self._counters["deduplicated"] += 1
+            if owner:
+                break
+            logger.info(f"Joining identical in-flight {feature} request.")
+            result = self._join(future, feature, deadline, timeout, cancel_event)
+            if result is not _RETRY:
+                return result
+            logger.info(f"Identical {feature} request was given up; running it for this caller.")
+
+        try:
+            result = self._run(feature, fn, args, kwargs, deadline - time.perf_counter(), cancel_event)
+        except (RequestCancelled, GatewayTimeout):
+            # Only this caller gave up; the others waiting on it must not fail with its error.
+            self._settle(dedupe_key, future, _RETRY)
+            raise
+        except BaseException as e:
+            self._settle(dedupe_key, future, exception=e)
+            raise
+        self._settle(dedupe_key, future, result)
+        return result
+
+    def _run(self, feature: str, fn, args, kwargs, timeout: float, cancel_event: threading.Event = None):
+        self._acquire(feature, timeout, cancel_event)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._release()
+
+    def _join(self, future: Future, feature: str, deadline: float, timeout: float,
+              cancel_event: threading.Event = None):
+        """Wait for a shared request's result, giving up on this caller's own cancel event and deadline."""
+        while not future.done():
+            with self._cond:
+                if cancel_event is not None and cancel_event.is_set():
+                    self._counters["cancelled"] += 1
+                    raise RequestCancelled(f"{feature} request cancelled while waiting for an identical request")
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise GatewayTimeout(f"{feature} request waited more than {timeout:g}s for the model")
+            wait([future], timeout=min(remaining, 0.1) if cancel_event is not None else remaining)
+        return future.result()
+
+    def _settle(self, dedupe_key, future: Future, result=None, exception: BaseException = None):
+        """Stop sharing a request, then hand its outcome to the callers waiting on it."""
+        with self._cond:
+            self._in_flight.pop(dedupe_key, None)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def stream(self, feature: str, tokens_factory, timeout: float = None, cancel_event: threading.Event = None):
+        """
+        Yield from `tokens_factory()` while holding a model slot.
+        The stream stops with `RequestCancelled` once `cancel_event` is set, and with
+        `GatewayTimeout` once it has run for longer than `timeout`.
+        """
+        timeout = timeout or self.default_timeout
+        started = time.perf_counter()
+        self._acquire(feature, timeout, cancel_event)
+        try:
+            for token in tokens_factory():
+                if cancel_event is not None and cancel_event.is_set():
+                    self._counters["cancelled"] += 1
+                    raise RequestCancelled(f"{feature} stream cancelled")
+                if time.perf_counter() - started > timeout:
+                    self._counters["timeouts"] += 1
+                    raise GatewayTimeout(f"{feature} stream ran for more than {timeout:g}s")
+                yield token
+        finally:
+            self._release()
+
+    def stats(self):
+        """Return queue depth, active requests and wait-time percentiles per feature."""
+        with self._cond:
+            depth = defaultdict(int)
+            for _, _, feature in self._queue:
+                depth[feature] += 1
+            waits = {feature: sorted(values) for feature, values in self._waits.items()}
+            stats = {
+                "active": self._active,
+                "max_concurrency": self.max_concurrency,
+                "queue_depth": sum(depth.values()),
+                "queued": dict(depth),
+                "counters": dict(self._counters),
+            }
+        stats["wait_seconds"] = {
+            feature: {
+                "p50": round(values[len(values) // 2], 3),
+                "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+                "max": round(values[-1], 3),
+            }
+            for feature, values in waits.items() if values
+        }
+        return stats
@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data) -> str:
+    """Return the SHA-256 hex digest of PDF bytes (or any buffer), matching `file_sha256`."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def render_thumbnail(data: bytes, max_width: int = 300, page: int = 0) -> bytes:
+    """Rasterize one page of an in-memory PDF to PNG bytes no wider than `max_width` pixels."""
+    import pymupdf
+    with pymupdf.open(stream=data, filetype="pdf") as doc:
+        pdf_page = doc[page]
+        zoom = max_width / pdf_page.rect.width
+        return pdf_page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom)).tobytes("png")
+
+
+def upload_key(uploaded_file):
+    """Identify an upload without reading it: Streamlit's `file_id`, else its name and size."""
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id:
+        return file_id
+    size = getattr(uploaded_file, "size", None)
+    return getattr(uploaded_file, "name", None), size if size is not None else len(uploaded_file.getbuffer())
+
+
+class ThumbnailCache:
+    """
+    A bounded LRU cache of first-page PNG thumbnails keyed by upload (see `upload_key`).
+
+    Each upload is rendered once and then served from memory, so Streamlit reruns neither hash
+    nor rasterize the PDF again. Sessions only wait for each other when rendering the same upload.
+    """
+
+    def __init__(self, max_entries: int = 64, max_width: int = 300):
+        self.max_entries = max_entries
+        self.max_width = max_width
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._rendering = {}
+
+    def _cached(self, key):
+        """Return a cached thumbnail and count the hit, or None. Call with the lock held."""
+        png = self.entries.get(key)
+        if png is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return png
+
+    def get(self, uploaded_file):
+        """Return the PNG thumbnail of an uploaded file or other binary buffer."""
+        key = upload_key(uploaded_file)
+        with self._lock:
+            png = self._cached(key)
+            if png is not None:
+                return png
+            key_lock = self._rendering.setdefault(key, threading.Lock())
+        # Render outside the shared lock; the per-upload lock stops concurrent reruns rendering it twice.
+        with key_lock:
+            with self._lock:
+                png = self._cached(key)
+                if png is not None:
+                    return png
+                self.misses += 1
+            try:
+                png = render_thumbnail(uploaded_file.getvalue(), self.max_width)
+            except BaseException:
+                with self._lock:
+                    self._rendering.pop(key, None)
+                raise
+            with self._lock:
+                self._rendering.pop(key, None)
+                self.entries[key] = png
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        logger.info(f"Rendered thumbnail for {key} ({len(png)} bytes)")
+        return png
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "bytes": sum(len(png) for png in self.entries.values()),
+        }
@@ -1,65 +1,20 @@
+import os
+import hashlib
 import streamlit as st
-import ollama
 import sqlite3
-import random
-import re
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+from sql_engine import QueryEngine
+from telemetry_gen import TelemetryGenerator, write_database
+from vehicle_db import VehicleDatabase
+from resources import get_gateway, get_tracer
 
 # Default database file (can be changed via UI)
 DEFAULT_DB_FILE = "vehicles.db"
 
-class VehicleDatabase:
-    def __init__(self, db_file):
-        self.conn = sqlite3.connect(db_file)
-        self.c = self.conn.cursor()
-        self.create_table()
-    
-    def create_table(self):
-        self.c.execute('''
-        CREATE TABLE IF NOT EXISTS vehicle_data (
-            vehicle_id TEXT,
-            event_time DATETIME,
-            latitude REAL,
-            longitude REAL,
-            speed REAL,
-            engine_state TEXT,
-            base_latitude REAL,
-            base_longitude REAL
-        )
-        ''')
-        self.conn.commit()
-    
-    def insert_vehicles(self, records):
-        self.c.executemany('''
-            INSERT INTO vehicle_data (
-                vehicle_id, event_time, latitude, longitude, speed, engine_state, base_latitude, base_longitude
-            ) VALUES (?,?,?,?,?,?,?,?)
-        ''', records)
-        self.conn.commit()
-    
-    def fetch_data(self, query):
-        self.c.execute(query)
-        return self.c.fetchall()
-    
-    def close(self):
-        self.conn.close()
-
-def generate_sql_query(question, database, table):
-    """Use DeepSeek R1 via Ollama to generate an SQL query."""
-    # {database}.
-    prompt = f"Generate an SQL query to answer: '{question}' using table {table} and it should return the all the columns from the table."
-    response = ollama.chat(model="deepseek-r1:latest", messages=[{"role": "user", "content": prompt}])
-    return response['message']['content']
-
-def extract_sql_query(text):
-    # Regular expression to find SQL queries inside triple backticks
-    pattern = re.compile(r'```sql\n(.*?)\n```', re.DOTALL)
-    
-    # Search for matches in the text
-    matches = pattern.findall(text)
-    
-    return matches
+@st.cache_resource
+def get_query_engine(db_file):
+    """Return the query engine for a database, shared across reruns and sessions."""
+    return QueryEngine(db_file, gateway=get_gateway(), tracer=get_tracer())
 
 # --- Main UI: Generate and Execute SQL Query for Data Insights ---
 st.set_page_config(page_title="Data Insights", layout="wide", initial_sidebar_state="expanded")
@@ -69,67 +24,94 @@ question = st.text_input("Enter your question:", "Type your question here...")
 # --- Sidebar: Data Ingestion and UI Inputs for Insight ---
 with st.sidebar:
     st.header("Data Ingestion")
+    fleet_size = st.number_input("Vehicles", min_value=1, max_value=100_000, value=6)
+    days = st.number_input("Days of telemetry", min_value=1, max_value=3650, value=30)
+    interval = st.number_input("Seconds between samples", min_value=1, max_value=3600, value=60)
+    # The seed and start date together pin down the generated data.
+    start = st.date_input("Start date", value=date.today() - timedelta(days=int(days)))
+    seed = st.number_input("Seed", min_value=0, value=0)
     if st.button("Ingest Random Data"):
-        # Create a VehicleDatabase instance using the default database file
-        db_ingest = VehicleDatabase(DEFAULT_DB_FILE)
-        vehicle_ids = ["REV1", "REV2", "REV3", "REV4", "REV5", "REV6"]
-        records = []
-        for _ in range(1000):
-            vehicle_id = random.choice(vehicle_ids)
-            event_time = (datetime.now() - timedelta(days=random.randint(0, 30),
-                                                       hours=random.randint(0, 23),
-                                                       minutes=random.randint(0, 59))
-                          ).strftime("%Y-%m-%d %H:%M:%S")
-            latitude = random.uniform(10.0, 30.0)
-            longitude = random.uniform(75.0, 85.0)
-            speed = random.uniform(0, 100)
-            engine_state = "ON" if speed > 0 else "OFF"
-            base_lat, base_long = 11.059821, 78.387451  # Default values for example
-            records.append((vehicle_id, event_time, latitude, longitude, speed, engine_state, base_lat, base_long))
-        db_ingest.insert_vehicles(records)
-        st.success("Random data ingested successfully!")
-        db_ingest.close()
+        generator = TelemetryGenerator(int(fleet_size), days, int(interval), start=start.isoformat(), seed=int(seed))
+        progress = st.progress(0.0)
+        status = st.empty()
+
+        def report(rows, rate):
+            progress.progress(rows / generator.total_rows)
+            status.caption(f"{rows:,}/{generator.total_rows:,} rows · {rate:,.0f} rows/s")
+
+        with VehicleDatabase(DEFAULT_DB_FILE) as db_ingest:
+            # Rebuilding the indexes once only pays off for large loads.
+            rate = write_database(db_ingest, generator, defer_indexes=generator.total_rows >= 1_000_000,
+                                  on_progress=report)
+        st.success(f"Ingested {generator.total_rows:,} rows ({rate:,.0f} rows/s).")
     
     st.header("Data Insight Settings")
     db_file = st.text_input("Enter Database Name", value=DEFAULT_DB_FILE)
     table_name = st.text_input("Enter Table Name", value="vehicle_data")
 
+    with st.expander("Latency by stage (p50/p95)"):
+        st.dataframe([{"stage": name, **row} for name, row in get_tracer().stats().items()], hide_index=True)
+
 if st.button("Get Insights"):
     # Pass the dynamic database and table names to your query generation
     database = db_file
     table = table_name
 
-    # Generate SQL query using your helper function (assumed to be defined elsewhere)
-    sql_query = generate_sql_query(question, database, table)
-    st.markdown("### 🔍 Generated SQL:")
-    st.code(sql_query, language="sql")
-    
-    # Extract only the SQL query portion from the generated text
+    # Generate SQL query from the cached schema prompt (repeated questions skip the LLM)
+    engine = get_query_engine(database)
+    with get_tracer().span("sql.translate") as span:
+        extracted_sql_query, sql_query, cached = engine.translate(question, table)
+        span.set(cached=cached)
+    if cached:
+        st.caption("⚡ Reused cached SQL translation")
+    else:
+        st.markdown("### 🔍 Generated SQL:")
+        st.code(sql_query, language="sql")
 
-    extracted_sql_query = extract_sql_query(sql_query)[0]
-    
+    if not extracted_sql_query:
+        st.error("No SQL query found in the model response. Please refine your question.")
+        st.stop()
+
+    st.session_state["insights_sql"] = extracted_sql_query
+    st.session_state["insights_db"] = database
+    st.session_state["insights_page"] = 1
+
+# --- Results: paginated preview, cheap row count and chunked export ---
+if st.session_state.get("insights_sql"):
+    extracted_sql_query = st.session_state["insights_sql"]
+    database = st.session_state["insights_db"]
     st.markdown("### 🔍 Extracted SQL Query:")
     st.code(extracted_sql_query, language="sql")
     
     # Execute and display query results safely
     try:
-        if not extracted_sql_query.lower().startswith("select"):
+        if not extracted_sql_query.lower().startswith(("select", "with")):
             st.error("Invalid SQL query generated. Please refine your question.")
         else:
-            db = VehicleDatabase(database)
-            data = db.fetch_data(extracted_sql_query)
-            # Convert data to a pandas DataFrame if it isn't one.
-            if not isinstance(data, pd.DataFrame):
-                columns = ["vehicle_id", "event_time", "latitude", "longitude", "speed", "engine_state", "base_latitude", "base_longitude"]
-                data = pd.DataFrame(data, columns=columns)
-                
+            page_size = st.selectbox("Rows per page", [6, 25, 100], index=0)
+            page = st.number_input("Page", min_value=1, step=1, key="insights_page")
+            with VehicleDatabase(database) as db:
+                with get_tracer().span("sql.execute", page_size=page_size) as span:
+                    data = db.page(extracted_sql_query, page_size, page - 1)
+                    span.set(rows=len(data))
+                with get_tracer().span("sql.count"):
+                    total = db.count_rows(extracted_sql_query)
+
             if not data.empty:
-                st.markdown("### 📊 Query Results (first 6 rows):")
-                st.caption("Total records fetched: " + str(len(data)))
-                st.dataframe(data.head(6))
+                st.markdown(f"### 📊 Query Results (page {page}):")
+                st.caption("Total records: " + (f"{total:,}" if total is not None else "too many to count quickly"))
+                st.dataframe(data)
             else:
                 st.write("No data found.")
-            db.close()
+
+            export_format = st.selectbox("Export format", ["csv", "parquet"])
+            if st.button("Export full result"):
+                os.makedirs("exports", exist_ok=True)
+                digest = hashlib.sha256(extracted_sql_query.encode("utf-8")).hexdigest()[:12]
+                export_path = os.path.join("exports", f"result_{digest}.{export_format}")
+                with st.spinner("Exporting..."), VehicleDatabase(database) as db:
+                    exported = db.export(extracted_sql_query, export_path)
+                st.success(f"Exported {exported:,} rows to {export_path}")
     except sqlite3.OperationalError as e:
         st.error(f"SQL execution error: {e}")
         print(f"SQL execution error: {e}")
@@ -0,0 +1,115 @@
+"""
+Process-wide shared resources.
+
+Model clients, embedders, caches and the Chroma client are created once per process and
+shared by every Streamlit session, in the spirit of `st.cache_resource`. `functools.cache`
+is used instead so the same objects are shared by the CLI and benchmarks too. Each
+`ChatOllama`/`OllamaEmbeddings` keeps its own HTTP connection pool, so sharing the
+instances also shares keep-alive connections to Ollama.
+"""
+import logging
+import os
+import time
+from functools import cache
+
+from langchain_ollama import ChatOllama, OllamaEmbeddings
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from jobs import JobManager
+from llm_gateway import LLMGateway
+from pdf_uploads import ThumbnailCache
+from semantic_cache import SemanticCache
+from tracing import Tracer, UsageCallback
+from transcript_cache import TranscriptCache
+
+logger = logging.getLogger(__name__)
+
+STARTUP_TIMINGS = {}
+
+
+def record_startup(name: str, seconds: float):
+    """Record how long a startup step took."""
+    STARTUP_TIMINGS[name] = round(seconds, 4)
+    logger.info(f"Startup: {name} took {seconds * 1000:.1f} ms")
+
+
+def _timed(name, factory):
+    started = time.perf_counter()
+    resource = factory()
+    record_startup(name, time.perf_counter() - started)
+    return resource
+
+
+@cache
+def get_chat_model(model: str = "deepseek-r1:latest", temperature: float = None):
+    """Return the shared chat model client for a model and temperature."""
+    return _timed(f"chat_model[{model}]", lambda: ChatOllama(model=model, temperature=temperature))
+
+
+@cache
+def get_embedding_cache():
+    return _timed("embedding_cache", EmbeddingCache)
+
+
+@cache
+def get_embeddings(model: str = "mxbai-embed-large", namespace: str = ""):
+    """Return the shared, cache-backed embedder for a model and splitter namespace."""
+    return _timed(f"embeddings[{model}]", lambda: CachedEmbeddings(
+        OllamaEmbeddings(model=model), get_embedding_cache(), model_name=model, namespace=namespace
+    ))
+
+
+@cache
+def get_answer_cache():
+    """Return the shared answer cache; its hits, misses and similarities go to the tracer."""
+    return _timed("answer_cache", lambda: SemanticCache(tracer=get_tracer()))
+
+
+@cache
+def get_transcript_cache():
+    return _timed("transcript_cache", TranscriptCache)
+
+
+@cache
+def get_thumbnail_cache():
+    return ThumbnailCache()
+
+
+@cache
+def get_gateway():
+    """Return the process-wide LLM gateway; `LLM_MAX_CONCURRENCY` sets its concurrency (default 2)."""
+    return LLMGateway(max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "2")))
+
+
+@cache
+def get_job_manager():
+    """Return the process-wide background job manager; `JOB_WORKERS` sets its worker count (default 4)."""
+    return JobManager(max_workers=int(os.environ.get("JOB_WORKERS", "4")))
+
+
+@cache
+def get_tracer():
+    """Return the process-wide tracer; spans go to `TRACE_FILE` (default traces.jsonl, empty to disable)."""
+    return Tracer(export_path=os.environ.get("TRACE_FILE", "traces.jsonl") or None)
+
+
+@cache
+def get_chroma_client(persist_directory: str = "chroma_db"):
+    """Return the shared persistent Chroma client for a directory, or the in-memory client for None."""
+    import chromadb
+    if persist_directory is None:
+        return _timed("chroma_client[memory]", chromadb.EphemeralClient)
+    return _timed("chroma_client", lambda: chromadb.PersistentClient(path=persist_directory))
+
+
+def debug_config(debug: bool = False, span=None):
+    """
+    Return a runnable config that prints a LangChain trace for this call only when `debug` is set,
+    and that adds the LLM's token usage to `span` when one is given.
+    """
+    callbacks = []
+    if span is not None:
+        callbacks.append(UsageCallback(span))
+    if debug:
+        from langchain_core.tracers import ConsoleCallbackHandler
+        callbacks.append(ConsoleCallbackHandler())
+    return {"callbacks": callbacks} if callbacks else {}
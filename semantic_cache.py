@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Numbers and numbered identifiers such as clause 1.2, 2024-01-01 or 10:30.
+NUMBER = re.compile(r"\d+(?:[.,:/-]\d+)*")
+
+
+def fingerprint(doc_ids) -> str:
+    """Return a stable fingerprint of a set of document IDs."""
+    return hashlib.sha256("\n".join(sorted(doc_ids)).encode("utf-8")).hexdigest()[:16]
+
+
+def numbers(text: str) -> frozenset:
+    """Return the numbers mentioned in `text`."""
+    return frozenset(NUMBER.findall(text or ""))
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class SemanticCache:
+    """
+    A semantic response cache.
+
+    Answers are stored under a namespace (document-set fingerprint, model, prompt version and
+    retrieval settings) together with the normalized query embedding and the sources the answer
+    was based on. A lookup returns the answer and sources of the most similar earlier query in
+    the same namespace if its cosine similarity is at least `threshold` and it mentions the same
+    numbers (so "clause 1.2" never gets the answer for "clause 2.2", whose embedding is almost
+    identical). Entries expire after `ttl_seconds`, and the least recently used ones are evicted
+    beyond `max_entries`. With a `tracer`, hits, misses and the best similarity of each lookup
+    are reported as `<name>.hit`, `<name>.miss` and `<name>.similarity` metrics.
+
+    Each namespace keeps its embeddings as one matrix, so a lookup scores every entry with a
+    single matrix product, computed outside the lock.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 2000, ttl_seconds: float = 24 * 3600,
+                 tracer=None, name: str = "answer_cache"):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.tracer = tracer
+        self.name = name
+        self.entries = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.saved_llm_seconds = 0.0
+        self._next_id = 0
+        self._members = {}
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def _matrix(self, namespace):
+        """Return `(entry ids, embedding matrix)` for a namespace, or None. Call with the lock held."""
+        members = self._members.get(namespace)
+        if not members:
+            return None
+        matrix = self._matrices.get(namespace)
+        if matrix is None:
+            # Rebuilt only after the namespace changed; the arrays are never modified in place.
+            matrix = self._matrices[namespace] = (list(members), np.stack(list(members.values())))
+        return matrix
+
+    def _remove(self, entry_id):
+        """Forget one entry. Call with the lock held."""
+        entry = self.entries.pop(entry_id)
+        members = self._members[entry["namespace"]]
+        del members[entry_id]
+        if not members:
+            del self._members[entry["namespace"]]
+        self._matrices.pop(entry["namespace"], None)
+
+    def lookup(self, namespace, vector, query: str = None):
+        """
+        Return the cached `{"answer", "sources"}` for a query embedding, or None. Pass the query
+        text to only match earlier queries that mention the same numbers.
+        """
+        normalized = _normalize(vector)
+        query_numbers = numbers(query) if query is not None else None
+        with self._lock:
+            self.lookups += 1
+            snapshot = self._matrix(namespace)
+        best, top_score = None, None
+        if snapshot is not None:
+            ids, matrix = snapshot
+            scores = matrix @ normalized
+            top_score = float(scores.max())
+            candidates = np.flatnonzero(scores >= self.threshold)
+            candidates = candidates[np.argsort(-scores[candidates])]
+            now = time.time()
+            with self._lock:
+                for index in candidates:
+                    entry = self.entries.get(ids[index])
+                    if entry is None:
+                        continue
+                    if now - entry["created"] > self.ttl_seconds:
+                        self._remove(ids[index])
+                        continue
+                    if query_numbers is not None and entry["numbers"] != query_numbers:
+                        continue
+                    best, best_score = ids[index], float(scores[index])
+                    self.entries.move_to_end(best)
+                    self.hits += 1
+                    self.saved_llm_seconds += entry["llm_seconds"]
+                    break
+        if self.tracer is not None:
+            self.tracer.count(f"{self.name}.{'miss' if best is None else 'hit'}")
+            if top_score is not None:
+                self.tracer.observe(f"{self.name}.similarity", top_score)
+        if best is None:
+            return None
+        logger.info(f"Semantic cache hit ({best_score:.3f}) for a query similar to: {entry['query']}")
+        return {"answer": entry["answer"], "sources": entry["sources"]}
+
+    def store(self, namespace, query: str, vector, answer: str, llm_seconds: float = 0.0, sources=None,
+              doc_ids=()):
+        """
+        Cache an answer and its sources, remembering how long the LLM took to produce it and the
+        `doc_ids` it was answered from.
+        """
+        normalized = _normalize(vector)
+        now = time.time()
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self.entries[entry_id] = {
+                "namespace": namespace,
+                "query": query,
+                "numbers": numbers(query),
+                "answer": answer,
+                "sources": list(sources or []),
+                "doc_ids": frozenset(doc_ids),
+                "llm_seconds": llm_seconds,
+                "created": now,
+            }
+            self._members.setdefault(namespace, {})[entry_id] = normalized
+            self._matrices.pop(namespace, None)
+            for expired in [i for i, e in self.entries.items() if now - e["created"] > self.ttl_seconds]:
+                self._remove(expired)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, doc_ids=None):
+        """Drop the entries answered from any of `doc_ids` (e.g. a changed document), or everything."""
+        with self._lock:
+            if doc_ids is None:
+                self.entries.clear()
+                self._members.clear()
+                self._matrices.clear()
+                return
+            doc_ids = set(doc_ids)
+            for entry_id in [i for i, e in self.entries.items() if e["doc_ids"] & doc_ids]:
+                self._remove(entry_id)
+
+    def stats(self):
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "saved_llm_seconds": round(self.saved_llm_seconds, 3),
+            "entries": len(self.entries),
+        }
@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import closing
+
+import ollama
+import pandas as pd
+
+from conversation_memory import strip_reasoning
+from tracing import span
+from vehicle_analytics import analytics_prompt, has_analytics
+
+logger = logging.getLogger(__name__)
+
+SQL_BLOCK = re.compile(r"```(?:sql|sqlite)?\s*\n(.*?)\n?```", re.DOTALL | re.IGNORECASE)
+
+
+def extract_sql_query(text):
+    """
+    Return the SQL statements found in an LLM reply, final answer first.
+    Reasoning blocks are dropped so draft queries inside `<think>` are ignored.
+    """
+    answer = strip_reasoning(text)
+    matches = [m.strip().rstrip(";") for m in SQL_BLOCK.findall(answer)]
+    if not matches:
+        bare = re.search(r"\b(SELECT|WITH)\b.*", answer, re.DOTALL | re.IGNORECASE)
+        matches = [bare.group(0).strip().rstrip(";")] if bare else []
+    return matches[::-1]
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivially different phrasings share a cache entry."""
+    return " ".join(re.sub(r"[^\w\s<>=.-]", " ", question.lower()).split())
+
+
+def frame_from_cursor(cursor, rows):
+    """Build a DataFrame whose columns come from `cursor.description`."""
+    return pd.DataFrame(rows, columns=[column[0] for column in cursor.description or []])
+
+
+def introspect_schema(conn, sample_values: int = 3):
+    """
+    Return `{table: {"columns", "indexes", "rows"}}` for every user table.
+    Each column is `(name, type, primary_key, sample values)`.
+    """
+    schema = {}
+    tables = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall()
+    # The shadow tables behind virtual tables (e.g. an R-tree's `_node`/`_parent`/`_rowid`) are internal.
+    virtual = [name for name, sql in tables if (sql or "").upper().startswith("CREATE VIRTUAL TABLE")]
+    for table, _ in tables:
+        if any(table.startswith(f"{name}_") for name in virtual):
+            continue
+        columns = []
+        for _, name, col_type, _, _, pk in conn.execute(f'PRAGMA table_info("{table}")'):
+            samples = [row[0] for row in conn.execute(
+                f'SELECT DISTINCT "{name}" FROM (SELECT "{name}" FROM "{table}" LIMIT 1000) '
+                f'WHERE "{name}" IS NOT NULL LIMIT ?', (sample_values,)
+            )]
+            columns.append((name, col_type, bool(pk), samples))
+        indexes = []
+        for _, index, *_ in conn.execute(f'PRAGMA index_list("{table}")'):
+            indexed = [row[2] for row in conn.execute(f'PRAGMA index_info("{index}")')]
+            indexes.append((index, indexed))
+        (rows,) = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone() if columns else (0,)
+        schema[table] = {"columns": columns, "indexes": indexes, "rows": rows or 0}
+    return schema
+
+
+def schema_prompt(schema, tables=None) -> str:
+    """Render a compact, deterministic schema description for the LLM prompt."""
+    lines = []
+    for table, info in schema.items():
+        if tables and table not in tables:
+            continue
+        lines.append(f"Table {table} (~{info['rows']} rows):")
+        for name, col_type, pk, samples in info["columns"]:
+            example = ", ".join(repr(value) for value in samples)
+            lines.append(f"  {name} {col_type or 'ANY'}{' PRIMARY KEY' if pk else ''}"
+                         f"{f'  e.g. {example}' if example else ''}")
+        for index, columns in info["indexes"]:
+            lines.append(f"  index {index} on ({', '.join(columns)})")
+    return "\n".join(lines)
+
+
+class QueryEngine:
+    """
+    Translate questions into SQLite queries for one database.
+
+    The schema is introspected once per database schema version and rendered into a compact
+    prompt. Translations are memoized by (schema hash, normalized question) in an LRU, so a
+    repeated dashboard question skips the LLM entirely. With a `gateway`, identical
+    in-flight translations share one model call. With a `tracer`, each translation is timed.
+    """
+
+    def __init__(self, db_file: str, model: str = "deepseek-r1:latest", max_cached: int = 1024, gateway=None,
+                 tracer=None):
+        self.db_file = db_file
+        self.gateway = gateway
+        self.tracer = tracer
+        self.model = model
+        self.max_cached = max_cached
+        self.translations = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._schema = None
+        self._schema_version = None
+        self._schema_hash = None
+        self._lock = threading.Lock()
+
+    def schema(self):
+        """Return the introspected schema and its hash, refreshing them if the schema changed."""
+        with closing(sqlite3.connect(self.db_file)) as conn:
+            (version,) = conn.execute("PRAGMA schema_version").fetchone()
+            if version != self._schema_version:
+                logger.info(f"Introspecting schema of {self.db_file} (version {version}).")
+                self._schema = introspect_schema(conn)
+                self._schema_version = version
+                structure = {t: ([c[:3] for c in i["columns"]], i["indexes"]) for t, i in self._schema.items()}
+                self._schema_hash = hashlib.sha256(repr(structure).encode("utf-8")).hexdigest()[:16]
+        return self._schema, self._schema_hash
+
+    def build_prompt(self, question: str, tables=None) -> str:
+        schema, _ = self.schema()
+        notes = f"{analytics_prompt()}\n\n" if has_analytics(schema) else ""
+        return (
+            "You write SQLite queries. Database schema:\n"
+            f"{schema_prompt(schema, tables)}\n\n"
+            f"{notes}"
+            f"Question: {question}\n\n"
+            "Answer with a single SQLite SELECT statement in a ```sql code block. Select only the "
+            "columns needed to answer the question and use the indexes where possible."
+        )
+
+    def translate(self, question: str, table: str = None):
+        """
+        Return `(sql, llm_reply, cached)` for a question; `llm_reply` is None on a cache hit.
+        """
+        with span(self.tracer, "sql.schema"):
+            _, schema_hash = self.schema()
+        key = (schema_hash, table, normalize_question(question))
+        with self._lock:
+            if key in self.translations:
+                self.translations.move_to_end(key)
+                self.hits += 1
+                return self.translations[key], None, True
+            self.misses += 1
+
+        prompt = self.build_prompt(question, [table] if table else None)
+        messages = [{"role": "user", "content": prompt}]
+        with span(self.tracer, "sql.generate") as generate:
+            if self.gateway is None:
+                response = ollama.chat(model=self.model, messages=messages)
+            else:
+                response = self.gateway.call("sql", ollama.chat, model=self.model, messages=messages, dedupe_key=key)
+            generate.record_usage(response)
+        reply = response["message"]["content"]
+        queries = extract_sql_query(reply)
+        sql = queries[0] if queries else None
+        if sql:
+            with self._lock:
+                self.translations[key] = sql
+                if len(self.translations) > self.max_cached:
+                    self.translations.popitem(last=False)
+        return sql, reply, False
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self.translations)}
@@ -0,0 +1,63 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TimedStream:
+    """
+    Wrap a token iterator and record time-to-first-token and total latency.
+
+    The clock starts when the wrapper is created, so pass the generator in before any
+    retrieval or prompt building that should count towards perceived latency.
+    `on_complete`, if given, is called with the stream once it is exhausted or closed.
+    Producers can add their own figures to `extra`; they are reported with the timings.
+    """
+
+    def __init__(self, tokens, label: str = "llm", on_complete=None):
+        self.tokens = tokens
+        self.label = label
+        self.on_complete = on_complete
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.completed = False
+        self.token_count = 0
+        self.text = ""
+        self.extra = {}
+
+    def __iter__(self):
+        parts = []
+        try:
+            for token in self.tokens:
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                self.token_count += 1
+                parts.append(token)
+                yield token
+            self.completed = True
+        finally:
+            self.finished_at = time.perf_counter()
+            self.text = "".join(parts)
+            logger.info(f"{self.label}: {self.stats()}")
+            if self.on_complete:
+                self.on_complete(self)
+
+    @property
+    def time_to_first_token(self):
+        """Seconds until the first token arrived, or None if none did."""
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def total_latency(self):
+        """Seconds from start to the end of the stream (so far, if still running)."""
+        return (self.finished_at or time.perf_counter()) - self.started
+
+    def stats(self):
+        ttft = self.time_to_first_token
+        return {
+            "ttft": None if ttft is None else round(ttft, 3),
+            "total": round(self.total_latency, 3),
+            "tokens": self.token_count,
+            **self.extra,
+        }
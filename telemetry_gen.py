@@ -0,0 +1,283 @@
+"""
+Vectorized synthetic vehicle telemetry for load tests.
+
+    python telemetry_gen.py --vehicles 1000 --days 30 --interval 30 --db vehicles.db
+    python telemetry_gen.py --vehicles 1000 --days 30 --parquet telemetry.parquet
+
+Each vehicle leaves a depot and drives a continuous GPS track. Engine ON and OFF periods
+alternate with random lengths, speed is zero while the engine is off, and every position
+delta matches the reported speed over the sampling interval (tracks bounce off the edges of
+the region). Rows are produced in columnar NumPy batches, one sampling round of the whole
+fleet after another, so 10-100 million rows can be streamed without holding them in memory.
+"""
+import argparse
+import logging
+import math
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE = 111.32
+
+
+def _reflect(values, low, high):
+    """Fold values back into [low, high] so tracks bounce off the region's edges without jumping."""
+    span = high - low
+    folded = np.mod(values - low, 2 * span)
+    return low + span - np.abs(folded - span)
+
+
+def _trailing_mean(values, window: int):
+    """Mean of each `window` consecutive columns; the result has `window - 1` fewer columns."""
+    steps = values.shape[1] - window + 1
+    # Summing shifted slices in a fixed order gives bit-identical results however the rows are split.
+    total = values[:, :steps].copy()
+    for i in range(1, window):
+        total += values[:, i:i + steps]
+    return total / window
+
+
+def _mix(x):
+    """The splitmix64 finalizer: a fast bijection on uint64 arrays that scrambles nearby inputs."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _stream_keys(seed: int, stream: int, vehicles: int):
+    """One random stream per vehicle, like `np.random.default_rng([seed, stream, vehicle])`."""
+    with np.errstate(over="ignore"):
+        key = _mix(np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15) + np.uint64(stream))
+        return _mix(key + np.arange(vehicles, dtype=np.uint64) * np.uint64(0xD1B54A32D192ED03))
+
+
+def _uniform(keys, counters):
+    """
+    Uniform (0, 1) draws that depend only on each vehicle's stream key and the draw's counter,
+    so any slice of a stream can be drawn on its own. `counters` is 1-D (shared by all
+    vehicles) or has one row per key.
+    """
+    counters = np.asarray(counters, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        bits = _mix(keys[:, None] + (counters + np.uint64(1)) * np.uint64(0x9E3779B97F4A7C15))
+    return ((bits >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+
+
+def _normal(keys, counters):
+    """Standard normal draws (Box-Muller) addressed like `_uniform`."""
+    counters = np.asarray(counters, dtype=np.int64)
+    radius = np.sqrt(-2 * np.log(_uniform(keys, 2 * counters)))
+    return radius * np.cos(2 * np.pi * _uniform(keys, 2 * counters + 1))
+
+
+# Random streams of each vehicle.
+PERIODS, SPEED, HEADING = 1, 2, 3
+SPEED_SMOOTHING = 10
+
+
+class TelemetryGenerator:
+    """
+    Generate telemetry for `vehicles` vehicles sampled every `interval_seconds` over `days` days
+    from `start` (by default midnight `days` days ago, so the data reaches today).
+
+    Vehicle state (position, heading, engine state and the current ON/OFF period) carries over
+    from one batch to the next, so tracks are continuous across batches. Every random value
+    is drawn from its vehicle's own stream at a fixed position, so the same `seed` and `start`
+    produce the same rows for any batch size.
+    """
+
+    def __init__(self, vehicles: int = 100, days: float = 30, interval_seconds: int = 30,
+                 start: str = None, seed: int = 0, region=(10.0, 30.0, 75.0, 85.0),
+                 mean_on_minutes: float = 45, mean_off_minutes: float = 30, cruise_kmh: float = 45):
+        self.vehicles = vehicles
+        self.interval_seconds = interval_seconds
+        self.steps = int(days * 86400 // interval_seconds)
+        if start:
+            started = datetime.fromisoformat(str(start))
+        else:
+            started = datetime.combine(date.today() - timedelta(days=math.ceil(days)), datetime.min.time())
+        self.start = np.datetime64(started.replace(microsecond=0), "s")
+        self.region = region
+        self.cruise_kmh = cruise_kmh
+        # Mean ON and OFF period lengths, in samples.
+        self.mean_steps = (max(1.0, mean_off_minutes * 60 / interval_seconds),
+                           max(1.0, mean_on_minutes * 60 / interval_seconds))
+        self.keys = {stream: _stream_keys(seed, stream, vehicles) for stream in (PERIODS, SPEED, HEADING)}
+
+        rng = np.random.default_rng(seed)
+        lat_low, lat_high, lon_low, lon_high = region
+        self.ids = np.array([f"REV{i + 1}" for i in range(vehicles)], dtype=object)
+        self.base_lat = rng.uniform(lat_low, lat_high, vehicles)
+        self.base_lon = rng.uniform(lon_low, lon_high, vehicles)
+        # Positions before folding into the region; `lat` is the last reported (folded) latitude.
+        self.lat_unfolded = self.base_lat.copy()
+        self.lon_unfolded = self.base_lon.copy()
+        self.lat = self.base_lat.copy()
+        self.heading = rng.uniform(0, 2 * math.pi, vehicles)
+        self.first_on = rng.random(vehicles) < 0.5
+        # Stagger the vehicles' sampling clocks so they do not all report on the same second.
+        self.offsets = rng.integers(0, interval_seconds, vehicles)
+        self.period = np.zeros(vehicles, dtype=np.int64)
+        self.remaining = self._period_lengths(self.period[:, None])[:, 0]
+        self.step = 0
+
+    @property
+    def total_rows(self):
+        return self.vehicles * self.steps
+
+    def _period_lengths(self, periods, rows=slice(None)):
+        """Return the lengths (in samples) of the ON/OFF periods numbered `periods` of vehicles `rows`."""
+        engine_on = self.first_on[rows, None] ^ (periods % 2 == 1)
+        p = 1.0 / np.where(engine_on, self.mean_steps[1], self.mean_steps[0])
+        # Geometric draws by inversion, so each period's length is fixed by its number.
+        with np.errstate(divide="ignore"):
+            lengths = np.ceil(np.log(_uniform(self.keys[PERIODS][rows], periods)) / np.log1p(-p))
+        return np.maximum(1, lengths).astype(np.int64)
+
+    def _engine_states(self, steps: int):
+        """Return a (vehicles, steps) boolean engine-state matrix and advance the ON/OFF periods."""
+        # Enough periods to cover the batch even if every period is short.
+        periods = 2
+        while True:
+            lengths = self._period_lengths(self.period[:, None] + np.arange(periods))
+            lengths[:, 0] = self.remaining
+            ends = np.cumsum(lengths, axis=1)
+            if (ends[:, -1] >= steps).all():
+                break
+            periods *= 2
+        # Row-wise searchsorted: shift each vehicle's period ends into its own disjoint range.
+        shift = (np.arange(self.vehicles) * (int(ends[:, -1].max()) + steps + 1))[:, None]
+        period = np.searchsorted((ends + shift).ravel(), (np.arange(steps)[None, :] + shift).ravel(), side="right")
+        period = period.reshape(self.vehicles, steps) - (np.arange(self.vehicles) * periods)[:, None]
+        states = self.first_on[:, None] ^ ((self.period[:, None] + period) % 2 == 1)
+
+        self.remaining = ends[np.arange(self.vehicles), period[:, -1]] - steps
+        self.period = self.period + period[:, -1]
+        # Periods that end exactly at the batch boundary give way to the next one.
+        done = np.flatnonzero(self.remaining == 0)
+        self.period[done] += 1
+        self.remaining[done] = self._period_lengths(self.period[done][:, None], done)[:, 0]
+        return states
+
+    def batch(self, steps: int):
+        """Return the next `steps` samples of every vehicle as a dict of column arrays."""
+        steps = min(steps, self.steps - self.step)
+        if steps <= 0:
+            return None
+        engine_on = self._engine_states(steps)
+        counters = self.step + np.arange(steps)
+
+        # The smoothing window reaches back into the previous batch (and repeats the first sample at the start).
+        window = np.maximum(0, self.step - SPEED_SMOOTHING + 1 + np.arange(steps + SPEED_SMOOTHING - 1))
+        noise = _normal(self.keys[SPEED], window)
+        speed = self.cruise_kmh + 15 * _trailing_mean(noise, SPEED_SMOOTHING) * math.sqrt(SPEED_SMOOTHING)
+        speed = np.where(engine_on, np.clip(speed, 5, 120), 0.0)
+
+        # Accumulate from the carried state in one left-to-right pass, as a single batch would.
+        turns = 0.15 * _normal(self.keys[HEADING], counters)
+        heading = np.cumsum(np.concatenate([self.heading[:, None], turns], axis=1), axis=1)[:, 1:]
+        distance_km = speed * self.interval_seconds / 3600
+        lat_low, lat_high, lon_low, lon_high = self.region
+        d_lat = distance_km * np.cos(heading) / KM_PER_DEGREE
+        lat_unfolded = np.cumsum(np.concatenate([self.lat_unfolded[:, None], d_lat], axis=1), axis=1)[:, 1:]
+        lat = _reflect(lat_unfolded, lat_low, lat_high)
+        # A degree of longitude shrinks with the latitude the vehicle is at when it moves.
+        moved_from = np.concatenate([self.lat[:, None], lat[:, :-1]], axis=1)
+        d_lon = distance_km * np.sin(heading) / (KM_PER_DEGREE * np.cos(np.radians(moved_from)))
+        lon_unfolded = np.cumsum(np.concatenate([self.lon_unfolded[:, None], d_lon], axis=1), axis=1)[:, 1:]
+        lon = _reflect(lon_unfolded, lon_low, lon_high)
+        self.heading = heading[:, -1]
+        self.lat_unfolded, self.lon_unfolded, self.lat = lat_unfolded[:, -1], lon_unfolded[:, -1], lat[:, -1]
+
+        seconds = counters[None, :] * self.interval_seconds + self.offsets[:, None]
+        times = np.datetime_as_string(self.start + seconds.astype("timedelta64[s]"), unit="s")
+        self.step += steps
+
+        # Transpose so rows come out one sampling round of the fleet at a time, as a live feed would.
+        return {
+            "vehicle_id": np.repeat(self.ids[None, :], steps, axis=0).ravel(),
+            "event_time": np.char.replace(times.T.ravel(), "T", " "),
+            "latitude": np.round(lat.T.ravel(), 6),
+            "longitude": np.round(lon.T.ravel(), 6),
+            "speed": np.round(speed.T.ravel(), 2),
+            "engine_state": np.where(engine_on.T.ravel(), "ON", "OFF"),
+            "base_latitude": np.repeat(np.round(self.base_lat, 6)[None, :], steps, axis=0).ravel(),
+            "base_longitude": np.repeat(np.round(self.base_lon, 6)[None, :], steps, axis=0).ravel(),
+        }
+
+    def batches(self, batch_rows: int = 100_000):
+        """Yield column batches of about `batch_rows` rows until the time span is covered."""
+        steps = max(1, batch_rows // self.vehicles)
+        while True:
+            batch = self.batch(steps)
+            if batch is None:
+                return
+            yield batch
+
+
+def write_database(db, generator: TelemetryGenerator, batch_rows: int = 100_000, defer_indexes: bool = True,
+                   on_progress=None):
+    """Stream the generator into a `VehicleDatabase`, one transaction per batch; returns rows/sec."""
+    return db.bulk_load_columns(generator.batches(batch_rows), defer_indexes=defer_indexes, on_progress=on_progress)
+
+
+def write_parquet(path: str, generator: TelemetryGenerator, batch_rows: int = 100_000, on_progress=None):
+    """Stream the generator into a Parquet file, one row group per batch (requires pyarrow); returns rows/sec."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Writing Parquet files requires pyarrow: pip install pyarrow") from e
+    rows, started, writer = 0, time.perf_counter(), None
+    try:
+        for batch in generator.batches(batch_rows):
+            table = pa.table({column: pa.array(values.tolist() if values.dtype == object else values)
+                              for column, values in batch.items()})
+            writer = writer or pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += table.num_rows
+            if on_progress:
+                on_progress(rows, rows / (time.perf_counter() - started))
+    finally:
+        if writer:
+            writer.close()
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed else 0.0
+    logger.info(f"Wrote {rows} rows to {path} in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic vehicle telemetry.")
+    parser.add_argument("--vehicles", type=int, default=100)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--interval", type=int, default=30, help="Seconds between samples per vehicle")
+    parser.add_argument("--start",
+                        help="First timestamp, e.g. '2024-01-01 00:00:00' (default: midnight --days days ago)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-rows", type=int, default=100_000)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--db", help="SQLite database to load into")
+    target.add_argument("--parquet", help="Parquet file to write")
+    args = parser.parse_args()
+
+    generator = TelemetryGenerator(args.vehicles, args.days, args.interval, args.start, args.seed)
+
+    def report(rows, rate):
+        print(f"\r{rows:,}/{generator.total_rows:,} rows · {rate:,.0f} rows/s", end="", file=sys.stderr)
+
+    if args.db:
+        from vehicle_db import VehicleDatabase
+        with VehicleDatabase(args.db) as db:
+            rate = write_database(db, generator, args.batch_rows, on_progress=report)
+    else:
+        rate = write_parquet(args.parquet, generator, args.batch_rows, on_progress=report)
+    print(f"\nDone: {generator.total_rows:,} rows at {rate:,.0f} rows/s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+from langchain_core.documents import Document
+
+from context_packer import ContextPacker
+
+
+def words(start, stop):
+    return " ".join(f"w{i}" for i in range(start, stop))
+
+
+def doc(text, source, page=0):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def test_long_block_containing_a_kept_chunk_survives():
+    short, long = words(100, 115), words(0, 383)
+    context, stats = ContextPacker(token_budget=10_000).pack([doc(short, "a.pdf"), doc(long, "b.pdf", 4)])
+    assert stats["duplicates"] == 0
+    assert stats["sources"] == ["[a.pdf, p. 1]", "[b.pdf, p. 5]"]
+    assert long in context
+
+
+def test_chunk_already_inside_a_kept_block_is_dropped():
+    short, long = words(100, 115), words(0, 383)
+    context, stats = ContextPacker(token_budget=10_000).pack([doc(long, "b.pdf", 4), doc(short, "a.pdf")])
+    assert stats["duplicates"] == 1
+    assert stats["sources"] == ["[b.pdf, p. 5]"]
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobManager
+from llm_gateway import LLMGateway
+
+
+def wait_until(condition, timeout: float = 2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1)
+    yield manager
+    manager.shutdown()
+
+
+def test_free_worker_goes_to_the_owner_served_longest_ago(manager):
+    release, order = threading.Event(), []
+
+    def work(job, tag):
+        release.wait()
+        order.append(tag)
+
+    jobs = [manager.submit(work, tag, owner=owner)
+            for tag, owner in (("a1", "a"), ("a2", "a"), ("a3", "a"), ("b1", "b"), ("c1", "c"))]
+    release.set()
+    wait_until(lambda: all(job.finished for job in jobs))
+    assert order == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_free_worker_goes_to_the_owner_with_fewest_running_jobs():
+    manager = JobManager(max_workers=2)
+    release = {tag: threading.Event() for tag in ("a1", "a2", "a3", "b1")}
+    jobs = {tag: manager.submit(lambda job, tag: release[tag].wait(), tag, owner=tag[0]) for tag in release}
+    assert [jobs[tag].status for tag in release] == [RUNNING, RUNNING, QUEUED, QUEUED]
+    release["a1"].set()
+    wait_until(lambda: jobs["b1"].status == RUNNING)
+    assert jobs["a3"].status == QUEUED
+    for event in release.values():
+        event.set()
+    manager.shutdown(cancel=False)
+    assert all(job.status == DONE for job in jobs.values())
+
+
+def test_progress_failure_and_result(manager):
+    def work(job):
+        job.update(0.5, "halfway")
+        return 42
+
+    done = manager.submit(work)
+    failed = manager.submit(lambda job: 1 / 0)
+    wait_until(lambda: done.finished and failed.finished)
+    assert (done.status, done.result, done.progress, done.message) == (DONE, 42, 0.5, "halfway")
+    assert failed.status == FAILED and isinstance(failed.error, ZeroDivisionError)
+    assert manager.stats()["done"] == 1
+
+
+def test_cancel_queued_and_running_jobs(manager):
+    started, ran = threading.Event(), []
+
+    def work(job):
+        started.set()
+        while True:
+            job.update()
+            time.sleep(0.01)
+
+    running = manager.submit(work)
+    queued = manager.submit(lambda job: ran.append(1))
+    started.wait(1)
+    assert manager.cancel(queued.id)
+    assert queued.status == CANCELLED
+    assert manager.cancel(running.id)
+    wait_until(lambda: running.finished)
+    assert running.status == CANCELLED and not ran
+    assert not manager.cancel(running.id)
+
+
+def test_cancelled_stream_is_closed(manager):
+    closed = []
+
+    def tokens():
+        try:
+            while True:
+                yield "x"
+                time.sleep(0.01)
+        finally:
+            closed.append(True)
+
+    job = manager.submit(lambda job: job.stream(tokens()))
+    wait_until(lambda: job.partial)
+    manager.cancel(job.id)
+    wait_until(lambda: job.finished)
+    assert job.status == CANCELLED and closed
+
+
+def test_cancel_reaches_a_request_queued_in_the_gateway(manager):
+    gateway, release, calls = LLMGateway(max_concurrency=1), threading.Event(), []
+    holder = threading.Thread(target=gateway.call, args=("code", release.wait))
+    holder.start()
+    wait_until(lambda: gateway.stats()["active"] == 1)
+
+    job = manager.submit(lambda job: job.stream(
+        gateway.stream("pdf_chat", lambda: calls.append(1) or iter(["token"]), cancel_event=job.cancel_event)
+    ))
+    wait_until(lambda: gateway.stats()["queue_depth"] == 1)
+    manager.cancel(job.id)
+    wait_until(lambda: job.finished, timeout=1.0)
+    release.set()
+    holder.join()
+    assert job.status == CANCELLED and not calls
@@ -0,0 +1,187 @@
+import threading
+import time
+
+import pytest
+
+from llm_gateway import GatewayTimeout, LLMGateway, RequestCancelled
+
+
+def wait_until(condition, timeout: float = 2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def busy_gateway():
+    """A single-slot gateway whose slot is held until the returned event is set."""
+    gateway = LLMGateway(max_concurrency=1)
+    release = threading.Event()
+    holder = threading.Thread(target=gateway.call, args=("code", release.wait))
+    holder.start()
+    wait_until(lambda: gateway.stats()["active"] == 1)
+    yield gateway, release
+    release.set()
+    holder.join()
+
+
+def test_waiting_requests_are_served_by_priority(busy_gateway):
+    gateway, release = busy_gateway
+    order = []
+    threads = [threading.Thread(target=gateway.call, args=(feature, order.append, feature))
+               for feature in ("batch", "summary", "pdf_chat")]
+    for thread in threads:
+        thread.start()
+        wait_until(lambda: gateway.stats()["queue_depth"] == threads.index(thread) + 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert order == ["pdf_chat", "summary", "batch"]
+
+
+def test_identical_in_flight_calls_share_one_result():
+    gateway = LLMGateway(max_concurrency=2)
+    release, calls, results = threading.Event(), [], []
+
+    def fn():
+        calls.append(1)
+        release.wait()
+        return "answer"
+
+    threads = [threading.Thread(target=lambda: results.append(gateway.call("sql", fn, dedupe_key="q")))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: gateway.stats()["counters"].get("deduplicated") == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ["answer"] * 3
+
+
+def test_dedupe_joiners_see_the_error():
+    gateway = LLMGateway()
+    release, errors = threading.Event(), []
+
+    def fn():
+        release.wait()
+        raise ValueError("boom")
+
+    def call():
+        try:
+            gateway.call("sql", fn, dedupe_key="q")
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: gateway.stats()["counters"].get("deduplicated") == 1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert errors == ["boom", "boom"]
+
+
+def test_cancelled_request_leaves_the_queue_without_calling_the_model(busy_gateway):
+    gateway, _ = busy_gateway
+    cancel, calls, errors = threading.Event(), [], []
+
+    def call():
+        try:
+            gateway.call("pdf_chat", calls.append, 1, cancel_event=cancel)
+        except RequestCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    wait_until(lambda: gateway.stats()["queue_depth"] == 1)
+    started = time.perf_counter()
+    cancel.set()
+    thread.join()
+    assert time.perf_counter() - started < 1.0
+    assert errors and not calls
+    assert gateway.stats()["queue_depth"] == 0
+
+
+def test_cancelled_stream_releases_its_slot():
+    gateway = LLMGateway(max_concurrency=1)
+    cancel = threading.Event()
+    stream = gateway.stream("code", lambda: iter(["a", "b", "c"]), cancel_event=cancel)
+    assert next(stream) == "a"
+    assert gateway.stats()["active"] == 1
+    cancel.set()
+    with pytest.raises(RequestCancelled):
+        next(stream)
+    assert gateway.stats()["active"] == 0
+
+
+def test_queued_request_times_out(busy_gateway):
+    gateway, _ = busy_gateway
+    with pytest.raises(GatewayTimeout):
+        gateway.call("batch", lambda: None, timeout=0.1)
+    assert gateway.stats()["counters"]["timeouts"] == 1
+
+
+def test_waiting_caller_takes_over_when_the_shared_request_is_cancelled(busy_gateway):
+    gateway, release = busy_gateway
+    cancel, calls, outcomes = threading.Event(), [], {}
+
+    def call(name, event=None):
+        try:
+            outcomes[name] = gateway.call("pdf_chat", lambda: calls.append(name) or "answer",
+                                          dedupe_key="q", cancel_event=event)
+        except RequestCancelled as e:
+            outcomes[name] = e
+
+    owner = threading.Thread(target=call, args=("owner", cancel))
+    owner.start()
+    wait_until(lambda: gateway.stats()["queue_depth"] == 1)
+    joiner = threading.Thread(target=call, args=("joiner",))
+    joiner.start()
+    wait_until(lambda: gateway.stats()["counters"].get("deduplicated") == 1)
+    cancel.set()
+    owner.join()
+    assert isinstance(outcomes["owner"], RequestCancelled)
+    wait_until(lambda: gateway.stats()["queue_depth"] == 1)
+    release.set()
+    joiner.join()
+    assert outcomes["joiner"] == "answer"
+    assert calls == ["joiner"]
+
+
+def test_waiting_caller_can_be_cancelled_on_its_own():
+    gateway = LLMGateway()
+    release, cancel, errors = threading.Event(), threading.Event(), []
+    owner = threading.Thread(target=gateway.call, args=("sql", release.wait), kwargs={"dedupe_key": "q"})
+    owner.start()
+    wait_until(lambda: gateway.stats()["active"] == 1)
+
+    def join():
+        try:
+            gateway.call("sql", release.wait, dedupe_key="q", cancel_event=cancel)
+        except RequestCancelled as e:
+            errors.append(e)
+
+    joiner = threading.Thread(target=join)
+    joiner.start()
+    wait_until(lambda: gateway.stats()["counters"].get("deduplicated") == 1)
+    cancel.set()
+    joiner.join(timeout=1.0)
+    assert errors and not joiner.is_alive()
+    release.set()
+    owner.join()
+
+
+def test_waiting_caller_times_out_on_its_own_deadline():
+    gateway = LLMGateway()
+    release = threading.Event()
+    owner = threading.Thread(target=gateway.call, args=("sql", release.wait), kwargs={"dedupe_key": "q"})
+    owner.start()
+    wait_until(lambda: gateway.stats()["active"] == 1)
+    with pytest.raises(GatewayTimeout):
+        gateway.call("sql", release.wait, dedupe_key="q", timeout=0.1)
+    release.set()
+    owner.join()
@@ -0,0 +1,49 @@
+from semantic_cache import SemanticCache
+from tracing import Tracer
+
+NAMESPACE = ("docs", "model", "1")
+SOURCES = [{"doc_id": "contract", "source": "contract.pdf", "page": 3}]
+
+
+def test_hit_returns_answer_and_sources():
+    cache = SemanticCache()
+    cache.store(NAMESPACE, "What does clause 1.2 say?", [1.0, 0.0], "It says X.", 2.0, SOURCES)
+    assert cache.lookup(NAMESPACE, [0.99, 0.05], "what does clause 1.2 say") == {
+        "answer": "It says X.", "sources": SOURCES
+    }
+    assert cache.lookup(("other",), [1.0, 0.0], "What does clause 1.2 say?") is None
+    assert cache.stats()["saved_llm_seconds"] == 2.0
+
+
+def test_queries_with_different_numbers_do_not_collide():
+    cache = SemanticCache()
+    cache.store(NAMESPACE, "What does clause 1.2 say?", [1.0, 0.0], "It says X.")
+    assert cache.lookup(NAMESPACE, [1.0, 0.0], "What does clause 2.2 say?") is None
+    assert cache.lookup(NAMESPACE, [1.0, 0.0], "What does clause 1.2.1 say?") is None
+    assert cache.lookup(NAMESPACE, [1.0, 0.0], "What does clause 1.2 state?") is not None
+
+
+def test_hits_misses_and_similarity_are_exported():
+    tracer = Tracer()
+    cache = SemanticCache(tracer=tracer)
+    cache.lookup(NAMESPACE, [1.0, 0.0], "first question")
+    cache.store(NAMESPACE, "first question", [1.0, 0.0], "answer")
+    cache.lookup(NAMESPACE, [1.0, 0.0], "first question")
+    cache.lookup(NAMESPACE, [0.0, 1.0], "unrelated question")
+
+    text = tracer.prometheus_text()
+    assert 'assistant_events_total{event="answer_cache.hit"} 1' in text
+    assert 'assistant_events_total{event="answer_cache.miss"} 2' in text
+    assert 'assistant_observed_value_count{metric="answer_cache.similarity"} 2' in text
+    assert 'assistant_observed_value_sum{metric="answer_cache.similarity"} 1.000000' in text
+
+
+def test_invalidate_drops_every_entry_drawing_on_a_document():
+    cache = SemanticCache()
+    cache.store(("only-a",), "question", [1.0, 0.0], "about A", doc_ids=["A"])
+    cache.store(("a-and-b",), "question", [1.0, 0.0], "about A and B", doc_ids=["A", "B"])
+    cache.store(("only-b",), "question", [1.0, 0.0], "about B", doc_ids=["B"])
+    cache.invalidate(["A"])
+    assert cache.lookup(("only-a",), [1.0, 0.0], "question") is None
+    assert cache.lookup(("a-and-b",), [1.0, 0.0], "question") is None
+    assert cache.lookup(("only-b",), [1.0, 0.0], "question")["answer"] == "about B"
@@ -0,0 +1,18 @@
+import numpy as np
+
+from telemetry_gen import TelemetryGenerator
+
+
+def generate(batch_rows: int, seed: int = 7):
+    generator = TelemetryGenerator(20, 1, 60, start="2024-01-01", seed=seed)
+    batches = list(generator.batches(batch_rows))
+    return {column: np.concatenate([batch[column] for batch in batches]) for column in batches[0]}
+
+
+def test_same_seed_gives_the_same_rows_for_any_batch_size():
+    expected = generate(10**6)
+    for batch_rows in (20, 333):
+        rows = generate(batch_rows)
+        for column, values in expected.items():
+            assert (rows[column] == values).all(), column
+    assert not (generate(10**6, seed=8)["speed"] == expected["speed"]).all()
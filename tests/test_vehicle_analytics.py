@@ -0,0 +1,112 @@
+import sqlite3
+
+import pytest
+
+from vehicle_analytics import create_analytics, haversine_km, refresh_analytics, register_functions
+from vehicle_db import ConnectionPool, VehicleDatabase
+
+OLD_SCHEMA = '''
+CREATE TABLE vehicle_data (
+    vehicle_id TEXT,
+    event_time DATETIME,
+    latitude REAL,
+    longitude REAL,
+    speed REAL,
+    engine_state TEXT,
+    base_latitude REAL,
+    base_longitude REAL
+)
+'''
+
+ROWS = [
+    ("REV1", "2024-01-01 10:00:05", 11.0, 78.0, 30.0, "ON", 11.05, 78.38),
+    ("REV1", "2024-01-01 10:30:00", 11.2, 78.1, 50.0, "ON", 11.05, 78.38),
+    ("REV1", "2024-01-01 11:00:00", 11.1, 78.1, 0.0, "OFF", 11.05, 78.38),
+    ("REV2", "2024-01-01T10:15:00", 12.0, 79.0, 20.0, "ON", 12.0, 79.0),
+]
+
+
+@pytest.fixture
+def old_db(tmp_path):
+    path = str(tmp_path / "vehicles.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(OLD_SCHEMA)
+        conn.executemany("INSERT INTO vehicle_data VALUES (?,?,?,?,?,?,?,?)", ROWS)
+    return path
+
+
+def test_refresh_works_on_tables_without_id(old_db):
+    conn = sqlite3.connect(old_db)
+    register_functions(conn)
+    create_analytics(conn)
+    assert refresh_analytics(conn) == len(ROWS)
+    assert refresh_analytics(conn) == 0
+    assert conn.execute("SELECT SUM(samples) FROM vehicle_daily").fetchone() == (len(ROWS),)
+
+
+def columns(db):
+    return [row[1] for row in db.fetch_data("PRAGMA table_info(vehicle_data)")]
+
+
+def test_opening_an_old_database_does_not_migrate_it(old_db):
+    with VehicleDatabase(old_db, pool=ConnectionPool(old_db, size=1)) as db:
+        assert "id" not in columns(db)
+        assert db.fetch_data("SELECT COUNT(*) FROM vehicle_data") == [(len(ROWS),)]
+
+
+def test_migrate_old_schema(old_db):
+    with VehicleDatabase(old_db, pool=ConnectionPool(old_db, size=1)) as db:
+        assert db.migrate_table()
+        assert not db.migrate_table()
+        assert columns(db)[0] == "id"
+        assert db.fetch_data("SELECT event_time FROM vehicle_data WHERE vehicle_id = 'REV2'") == [
+            ("2024-01-01 10:15:00",)
+        ]
+        hourly = db.fetch_data(
+            "SELECT vehicle_id, hour, samples, on_samples, speed_sum, max_speed FROM vehicle_hourly ORDER BY 1, 2"
+        )
+        assert hourly == [
+            ("REV1", "2024-01-01 10:00:00", 2, 2, 80.0, 50.0),
+            ("REV1", "2024-01-01 11:00:00", 1, 0, 0.0, 0.0),
+            ("REV2", "2024-01-01 10:00:00", 1, 1, 20.0, 20.0),
+        ]
+
+
+def test_rollups_follow_inserts(tmp_path):
+    path = str(tmp_path / "vehicles.db")
+    with VehicleDatabase(path, pool=ConnectionPool(path, size=1)) as db:
+        db.insert_vehicles(ROWS[:2])
+        db.bulk_load(ROWS[2:])
+        (max_base_km,) = db.fetch_data(
+            "SELECT max_base_km FROM vehicle_daily WHERE vehicle_id = 'REV1' AND day = '2024-01-01'"
+        )[0]
+        assert max_base_km == pytest.approx(max(haversine_km(*row[2:4], *row[6:8]) for row in ROWS[:3]))
+        inside = db.fetch_data(
+            "SELECT h.vehicle_id FROM vehicle_position_index r JOIN vehicle_hourly h ON h.id = r.id "
+            "WHERE r.max_lat >= 11.9 AND r.min_lat <= 12.1 AND r.max_lon >= 78.9 AND r.min_lon <= 79.1"
+        )
+        assert inside == [("REV2",)]
+
+
+def test_migration_quarantines_rows_without_vehicle_or_time(old_db):
+    with sqlite3.connect(old_db) as conn:
+        conn.execute("INSERT INTO vehicle_data VALUES (NULL, '2024-01-01 12:00:00', 1, 2, 3, 'ON', 1, 2)")
+    with VehicleDatabase(old_db, pool=ConnectionPool(old_db, size=1)) as db:
+        db.migrate_table()
+        assert db.fetch_data("SELECT COUNT(*) FROM vehicle_data") == [(len(ROWS),)]
+        assert db.fetch_data("SELECT old_rowid, vehicle_id, event_time FROM vehicle_data_rejected") == [
+            (len(ROWS) + 1, None, "2024-01-01 12:00:00")
+        ]
+
+
+def test_failed_migration_leaves_the_old_table(old_db):
+    with sqlite3.connect(old_db) as conn:
+        conn.execute("INSERT INTO vehicle_data VALUES ('REV3', NULL, 1, 2, 3, 'ON', 1, 2)")
+        # Moving the rejected row fails half-way through the migration.
+        conn.execute("CREATE VIEW vehicle_data_rejected AS SELECT 1")
+    with VehicleDatabase(old_db, pool=ConnectionPool(old_db, size=1)) as db:
+        with pytest.raises(sqlite3.OperationalError):
+            db.migrate_table()
+        assert "id" not in columns(db)
+        assert db.fetch_data("SELECT COUNT(*) FROM vehicle_data") == [(len(ROWS) + 1,)]
+        assert not db.fetch_data("SELECT name FROM sqlite_master WHERE name = 'vehicle_data_old'")
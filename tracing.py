@@ -0,0 +1,242 @@
+"""
+Lightweight span timing for the assistants.
+
+    with tracer.span("pdf.retrieve", k=5) as span:
+        docs = retrieve(...)
+        span.set(results=len(docs))
+
+Finished spans are appended to a JSONL file, and per-stage latency percentiles and token
+throughput are kept in memory for the debug panel and the Prometheus text export. Token
+counts come from the usage statistics Ollama returns with each response. Components can also
+`count` events (e.g. cache hits) and `observe` values (e.g. similarity scores) for the export.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+# Ollama response fields, in nanoseconds for the durations.
+USAGE_FIELDS = ("prompt_eval_count", "eval_count", "prompt_eval_duration", "eval_duration", "load_duration")
+
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Span:
+    """One timed stage. Attributes added with `set` and `record_usage` are exported with it."""
+
+    def __init__(self, tracer, name: str, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = dict(attrs)
+        self.started_at = time.time()
+        self.started = None
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def record_usage(self, metadata):
+        """Add the token counts and timings from an Ollama response's metadata to this span."""
+        if not metadata:
+            return
+        for field in USAGE_FIELDS:
+            if metadata.get(field):
+                self.attrs[field] = self.attrs.get(field, 0) + metadata[field]
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.started
+        if exc_type is GeneratorExit:
+            self.attrs["status"] = "cancelled"
+        elif exc_type is not None:
+            self.attrs["status"] = "error"
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        if self.tracer is not None:
+            self.tracer._finish(self)
+        return False
+
+    @property
+    def tokens_per_second(self):
+        """Decode throughput reported by Ollama, or None if no usage was recorded."""
+        if self.attrs.get("eval_count") and self.attrs.get("eval_duration"):
+            return self.attrs["eval_count"] / (self.attrs["eval_duration"] / 1e9)
+        return None
+
+    def as_dict(self):
+        record = {
+            "id": uuid.uuid4().hex[:16],
+            "name": self.name,
+            "start": round(self.started_at, 6),
+            "duration": round(self.duration, 6),
+            **self.attrs,
+        }
+        if self.tokens_per_second is not None:
+            record["tokens_per_sec"] = round(self.tokens_per_second, 2)
+        return record
+
+
+def span(tracer, name: str, **attrs):
+    """Return a span on `tracer`, or a span that records nothing when `tracer` is None."""
+    return tracer.span(name, **attrs) if tracer is not None else Span(None, name, attrs)
+
+
+def first_token_timer(span: Span, tokens):
+    """Yield from `tokens`, recording on `span` how long the first one took to arrive."""
+    for token in tokens:
+        if "first_token_seconds" not in span.attrs:
+            span.set(first_token_seconds=round(time.perf_counter() - span.started, 4))
+        yield token
+
+
+class UsageCallback(BaseCallbackHandler):
+    """A LangChain callback that adds Ollama token usage from each LLM response to a span."""
+
+    def __init__(self, span: Span):
+        self.span = span
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                self.span.record_usage(generation.generation_info or getattr(message, "response_metadata", None))
+
+
+class Tracer:
+    """
+    Collect spans, keep the last `window` durations per stage, and append each finished span
+    to `export_path` as one JSON line (if set).
+    """
+
+    def __init__(self, export_path: str = None, window: int = 1000):
+        self.export_path = export_path
+        self._durations = defaultdict(lambda: deque(maxlen=window))
+        self._throughput = defaultdict(lambda: deque(maxlen=window))
+        self._totals = defaultdict(lambda: defaultdict(float))
+        self._events = defaultdict(int)
+        self._observed = defaultdict(lambda: deque(maxlen=window))
+        self._observed_totals = defaultdict(lambda: [0, 0.0])
+        self._lock = threading.Lock()
+        self._file = None
+
+    def span(self, name: str, **attrs) -> Span:
+        return Span(self, name, attrs)
+
+    def count(self, event: str, n: int = 1):
+        """Add `n` to the counter of `event`."""
+        with self._lock:
+            self._events[event] += n
+
+    def observe(self, metric: str, value: float):
+        """Record one observed value of `metric`; the export shows its median, p95, sum and count."""
+        with self._lock:
+            self._observed[metric].append(value)
+            totals = self._observed_totals[metric]
+            totals[0] += 1
+            totals[1] += value
+
+    def _finish(self, span: Span):
+        record = span.as_dict()
+        with self._lock:
+            self._durations[span.name].append(span.duration)
+            if span.tokens_per_second is not None:
+                self._throughput[span.name].append(span.tokens_per_second)
+            totals = self._totals[span.name]
+            totals["count"] += 1
+            totals["seconds"] += span.duration
+            totals["prompt_tokens"] += span.attrs.get("prompt_eval_count", 0)
+            totals["completion_tokens"] += span.attrs.get("eval_count", 0)
+            if self.export_path:
+                try:
+                    if self._file is None:
+                        self._file = open(self.export_path, "a", encoding="utf-8")
+                    self._file.write(json.dumps(record, default=str) + "\n")
+                    self._file.flush()
+                except OSError as e:
+                    logger.warning(f"Could not write trace to {self.export_path}: {e}")
+                    self.export_path = None
+
+    def stats(self):
+        """Return count, p50, p95 and max latency (seconds) and median tokens/sec per stage."""
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+            throughput = {name: sorted(values) for name, values in self._throughput.items()}
+            counts = {name: int(totals["count"]) for name, totals in self._totals.items()}
+        stats = {}
+        for name, values in sorted(durations.items()):
+            if not values:
+                continue
+            stats[name] = {
+                "count": counts.get(name, len(values)),
+                "p50": round(_percentile(values, 0.5), 4),
+                "p95": round(_percentile(values, 0.95), 4),
+                "max": round(values[-1], 4),
+            }
+            if throughput.get(name):
+                stats[name]["tokens_per_sec"] = round(_percentile(throughput[name], 0.5), 2)
+        return stats
+
+    def prometheus_text(self):
+        """Render the stage metrics in the Prometheus text exposition format."""
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+            totals = {name: dict(values) for name, values in self._totals.items()}
+            events = dict(self._events)
+            observed = {name: sorted(values) for name, values in self._observed.items()}
+            observed_totals = {name: tuple(values) for name, values in self._observed_totals.items()}
+        lines = [
+            "# HELP assistant_stage_latency_seconds Latency of each assistant stage.",
+            "# TYPE assistant_stage_latency_seconds summary",
+        ]
+        for name, values in sorted(durations.items()):
+            if not values:
+                continue
+            for q in (0.5, 0.95):
+                lines.append(f'assistant_stage_latency_seconds{{stage="{name}",quantile="{q}"}} '
+                             f"{_percentile(values, q):.6f}")
+            lines.append(f'assistant_stage_latency_seconds_sum{{stage="{name}"}} {totals[name]["seconds"]:.6f}')
+            lines.append(f'assistant_stage_latency_seconds_count{{stage="{name}"}} {int(totals[name]["count"])}')
+        lines += [
+            "# HELP assistant_llm_tokens_total Tokens processed by the LLM per stage.",
+            "# TYPE assistant_llm_tokens_total counter",
+        ]
+        for name, values in sorted(totals.items()):
+            for kind in ("prompt", "completion"):
+                if values[f"{kind}_tokens"]:
+                    lines.append(f'assistant_llm_tokens_total{{stage="{name}",kind="{kind}"}} '
+                                 f'{int(values[f"{kind}_tokens"])}')
+        lines += [
+            "# HELP assistant_events_total Events counted by the assistants, e.g. cache hits and misses.",
+            "# TYPE assistant_events_total counter",
+        ]
+        for name, value in sorted(events.items()):
+            lines.append(f'assistant_events_total{{event="{name}"}} {value}')
+        lines += [
+            "# HELP assistant_observed_value Values observed by the assistants, e.g. cache similarity scores.",
+            "# TYPE assistant_observed_value summary",
+        ]
+        for name, values in sorted(observed.items()):
+            for q in (0.5, 0.95):
+                lines.append(f'assistant_observed_value{{metric="{name}",quantile="{q}"}} '
+                             f"{_percentile(values, q):.6f}")
+            count, total = observed_totals[name]
+            lines.append(f'assistant_observed_value_sum{{metric="{name}"}} {total:.6f}')
+            lines.append(f'assistant_observed_value_count{{metric="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path: str = "metrics.prom"):
+        """Write the Prometheus text metrics to `path`, e.g. for node_exporter's textfile collector."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        return path
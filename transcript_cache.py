@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "transcript_cache.db"
+
+
+class TranscriptCache:
+    """
+    An on-disk SQLite cache of transcript segments and finished summaries.
+
+    Transcripts are keyed by (video ID, language) and summaries by (video ID, model, prompt
+    version). Entries expire after `ttl_seconds`; when the stored values exceed `max_bytes`
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: float = 7 * 24 * 3600,
+                 max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)")
+        self._conn.commit()
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def _put(self, key, value):
+        data = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (key, data, len(data), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """Drop expired entries, then the least recently used ones until under `max_bytes`."""
+        self._conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,))
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} entries from the transcript cache.")
+
+    def get_transcript(self, video_id: str, language: str):
+        """Return cached transcript segments, or None."""
+        return self._get(f"transcript|{video_id}|{language}")
+
+    def put_transcript(self, video_id: str, language: str, segments):
+        self._put(f"transcript|{video_id}|{language}", list(segments))
+
+    def get_summary(self, video_id: str, model: str, prompt_version: str):
+        """Return a cached summary, or None."""
+        return self._get(f"summary|{video_id}|{model}|{prompt_version}")
+
+    def put_summary(self, video_id: str, model: str, prompt_version: str, summary: str):
+        self._put(f"summary|{video_id}|{model}|{prompt_version}", summary)
+
+    def stats(self):
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": size}
+
+
+class YouTubeTranscriptSource:
+    """Fetch transcripts from YouTube."""
+
+    def fetch(self, video_id: str, language: str = "en"):
+        from youtube_transcript_api import YouTubeTranscriptApi
+        return YouTubeTranscriptApi.get_transcript(video_id, languages=[language])
+
+
+class FixtureTranscriptSource:
+    """Load transcripts from `<directory>/<video_id>.json` files, for tests and benchmarks."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def fetch(self, video_id: str, language: str = "en"):
+        with open(os.path.join(self.directory, f"{video_id}.json"), encoding="utf-8") as f:
+            return json.load(f)
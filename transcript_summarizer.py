@@ -0,0 +1,159 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from conversation_memory import strip_reasoning
+from streaming import TimedStream
+from tracing import UsageCallback, first_token_timer, span
+
+logger = logging.getLogger(__name__)
+
+# Bump when MAP_PROMPT/REDUCE_PROMPT or the chunking change, so cached summaries are not reused.
+PROMPT_VERSION = "1"
+
+MAP_PROMPT = (
+    "You are summarizing one section of a YouTube video transcript. Write 3-6 short bullet points "
+    "with the key facts and ideas of this section only. Reply with the bullet points only."
+)
+
+REDUCE_PROMPT = (
+    "You are Youtube video summarizer. You will be given section notes of a video, each headed by a "
+    "timestamp link. Combine them into the important summary of the entire video in points within "
+    "250 words. Keep the most relevant timestamp link at the end of each point."
+)
+
+
+def format_timestamp(seconds: float) -> str:
+    """Format seconds as h:mm:ss (or m:ss for under an hour)."""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+
+def timestamp_link(video_id: str, seconds: float) -> str:
+    """Return a markdown link to a position in a video."""
+    label = format_timestamp(seconds)
+    if not video_id:
+        return f"[{label}]"
+    return f"[{label}](https://www.youtube.com/watch?v={video_id}&t={int(seconds)}s)"
+
+
+class TranscriptChunk:
+    """A contiguous run of transcript segments."""
+
+    def __init__(self, start: float, end: float, text: str):
+        self.start = start
+        self.end = end
+        self.text = text
+
+
+def chunk_segments(segments, max_chars: int = 12000, max_seconds: float = 900):
+    """
+    Group `{"text", "start", "duration"}` segments into chunks of at most `max_chars`
+    characters and `max_seconds` of video, never splitting a segment.
+    """
+    chunks, parts, size, start = [], [], 0, None
+    for segment in segments:
+        text = segment["text"].strip()
+        seg_start = segment["start"]
+        if parts and (size + len(text) > max_chars or seg_start - start > max_seconds):
+            chunks.append(TranscriptChunk(start, seg_start, " ".join(parts)))
+            parts, size = [], 0
+        if not parts:
+            start = seg_start
+        parts.append(text)
+        size += len(text) + 1
+        end = seg_start + segment.get("duration", 0)
+    if parts:
+        chunks.append(TranscriptChunk(start, end, " ".join(parts)))
+    return chunks
+
+
+class TranscriptSummarizer:
+    """
+    Map-reduce summarization of long transcripts.
+
+    Chunks are summarized concurrently on a bounded thread pool (map), then the timestamped
+    section notes are combined into the final notes (reduce). Wall-clock time is roughly that
+    of the slowest chunk plus one reduce call, instead of the sum over all chunks.
+    With a `gateway`, model calls are queued at "summary" priority behind interactive chat.
+    With a `tracer`, every map and reduce call is timed along with its token usage.
+    Setting `cancel_event` makes queued and running gateway calls give up.
+    """
+
+    def __init__(self, llm, max_workers: int = 4, chunk_chars: int = 12000,
+                 chunk_seconds: float = 900, reduce_chars: int = 16000, gateway=None, tracer=None,
+                 cancel_event=None):
+        self.llm = llm
+        self.gateway = gateway
+        self.cancel_event = cancel_event
+        self.tracer = tracer
+        self.max_workers = max_workers
+        self.chunk_chars = chunk_chars
+        self.chunk_seconds = chunk_seconds
+        self.reduce_chars = reduce_chars
+
+    def _invoke(self, stage, messages):
+        with span(self.tracer, f"yt.{stage}") as timed:
+            if self.gateway is None:
+                response = self.llm.invoke(messages)
+            else:
+                response = self.gateway.call("summary", self.llm.invoke, messages, cancel_event=self.cancel_event)
+            timed.record_usage(response.response_metadata)
+        return response
+
+    def _summarize_chunk(self, chunk: TranscriptChunk, video_id: str) -> str:
+        response = self._invoke("map", [SystemMessage(content=MAP_PROMPT), HumanMessage(content=chunk.text)])
+        return f"{timestamp_link(video_id, chunk.start)}\n{strip_reasoning(response.content)}"
+
+    def _combine(self, notes):
+        response = self._invoke("reduce", [SystemMessage(content=REDUCE_PROMPT), HumanMessage(content="\n\n".join(notes))])
+        return strip_reasoning(response.content)
+
+    def map(self, segments, video_id: str = None):
+        """Summarize each chunk concurrently and return the timestamped section notes in order."""
+        chunks = chunk_segments(segments, self.chunk_chars, self.chunk_seconds)
+        logger.info(f"Summarizing {len(chunks)} transcript chunks with {self.max_workers} workers.")
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            return list(pool.map(lambda chunk: self._summarize_chunk(chunk, video_id), chunks))
+
+    def _collapse(self, notes):
+        """Reduce groups of notes until the whole set fits in one reduce prompt."""
+        while len(notes) > 1 and sum(len(note) for note in notes) > self.reduce_chars:
+            groups, group, size = [], [], 0
+            for note in notes:
+                if group and size + len(note) > self.reduce_chars:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(note)
+                size += len(note)
+            groups.append(group)
+            with ThreadPoolExecutor(self.max_workers) as pool:
+                notes = list(pool.map(self._combine, groups))
+        return notes
+
+    def stream(self, segments, video_id: str = None):
+        """
+        Run the map phase and stream the final reduce step as a `TimedStream` of tokens.
+        """
+        def tokens():
+            notes = self._collapse(self.map(segments, video_id))
+            chain = self.llm | StrOutputParser()
+            messages = [SystemMessage(content=REDUCE_PROMPT), HumanMessage(content="\n\n".join(notes))]
+            with span(self.tracer, "yt.reduce") as timed:
+                config = {"callbacks": [UsageCallback(timed)]}
+                if self.gateway is None:
+                    yield from first_token_timer(timed, chain.stream(messages, config=config))
+                else:
+                    yield from first_token_timer(
+                        timed, self.gateway.stream("summary", lambda: chain.stream(messages, config=config),
+                                                   cancel_event=self.cancel_event)
+                    )
+
+        return TimedStream(tokens(), label="transcript_summarizer")
+
+    def summarize(self, segments, video_id: str = None) -> str:
+        """Return the final notes for a transcript."""
+        return self._combine(self._collapse(self.map(segments, video_id)))
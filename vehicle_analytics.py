@@ -0,0 +1,186 @@
+"""
+Precomputed analytics over `vehicle_data`.
+
+Rollup tables hold per-vehicle hourly and daily aggregates (sample counts, speed sums and
+maxima, engine-on samples, farthest distance from base and the bounding box of positions).
+An R-tree indexes the position bounds of every vehicle-hour, so bounding-box questions touch
+only the matching hours instead of every row. Both are maintained incrementally:
+`refresh_analytics` aggregates only the rows added since its last run, inside the caller's
+transaction, so the aggregates commit atomically with the inserts. `vehicle_data` is treated
+as append-only; call `rebuild_analytics` after updating or deleting rows.
+"""
+import logging
+import math
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+ROLLUPS = {
+    "vehicle_hourly": "hour",
+    "vehicle_daily": "day",
+}
+
+SPATIAL_INDEX = "vehicle_position_index"
+
+# Distance from base in plain SQL, about twice as fast as calling back into Python per row.
+BASE_DISTANCE_SQL = (
+    f"2 * {EARTH_RADIUS_KM} * asin(min(1.0, sqrt(pow(sin(radians(base_latitude - latitude) / 2), 2)"
+    " + cos(radians(latitude)) * cos(radians(base_latitude))"
+    " * pow(sin(radians(base_longitude - longitude) / 2), 2))))"
+)
+
+# How each aggregate column combines with the value already stored for its bucket.
+AGGREGATES = {
+    "samples": "SUM",
+    "on_samples": "SUM",
+    "speed_sum": "SUM",
+    "max_speed": "MAX",
+    "max_base_km": "MAX",
+    "min_latitude": "MIN",
+    "max_latitude": "MAX",
+    "min_longitude": "MIN",
+    "max_longitude": "MAX",
+}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres, or None if any coordinate is missing."""
+    if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def register_functions(conn):
+    """Register the analytics SQL functions (currently `haversine_km`) on a connection."""
+    conn.create_function("haversine_km", 4, haversine_km, deterministic=True)
+
+
+def _base_distance_sql(conn) -> str:
+    """Return the distance-from-base expression, using SQLite's math functions when it was built with them."""
+    try:
+        conn.execute("SELECT asin(1)")
+        return BASE_DISTANCE_SQL
+    except sqlite3.OperationalError:
+        return "haversine_km(latitude, longitude, base_latitude, base_longitude)"
+
+
+def create_analytics(conn):
+    """Create the rollup tables, the spatial index and the refresh watermark if they do not exist."""
+    for table, bucket in ROLLUPS.items():
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            vehicle_id TEXT NOT NULL,
+            {bucket} TEXT NOT NULL,
+            samples INTEGER NOT NULL,
+            on_samples INTEGER NOT NULL,
+            speed_sum REAL,
+            max_speed REAL,
+            max_base_km REAL,
+            min_latitude REAL,
+            max_latitude REAL,
+            min_longitude REAL,
+            max_longitude REAL,
+            UNIQUE (vehicle_id, {bucket})
+        )
+        ''')
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{bucket} ON {table} ({bucket})")
+    conn.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SPATIAL_INDEX} USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS analytics_state (name TEXT PRIMARY KEY, last_id INTEGER NOT NULL)")
+
+
+def _upsert(conn, table: str, bucket: str, select: str):
+    """Insert the bucket rows produced by `select` into a rollup, merging them into existing buckets."""
+    merge = ",\n            ".join(
+        f"{column} = coalesce({column}, 0) + coalesce(excluded.{column}, 0)" if function == "SUM"
+        else f"{column} = coalesce({function.lower()}({column}, excluded.{column}), {column}, excluded.{column})"
+        for column, function in AGGREGATES.items()
+    )
+    # `WHERE true` keeps SQLite from parsing ON CONFLICT as a join constraint.
+    conn.execute(f'''
+        INSERT INTO {table} (vehicle_id, {bucket}, {", ".join(AGGREGATES)})
+        SELECT * FROM ({select}) WHERE true
+        ON CONFLICT (vehicle_id, {bucket}) DO UPDATE SET
+            {merge}
+    ''')
+
+
+def refresh_analytics(conn) -> int:
+    """
+    Fold the `vehicle_data` rows added since the last refresh into the rollups and the spatial
+    index, and return how many rows were processed. Does not commit. The watermark is the
+    rowid, so tables from before the `id` column (which aliases it) work too.
+    """
+    row = conn.execute("SELECT last_id FROM analytics_state WHERE name = 'vehicle_data'").fetchone()
+    last_id = row[0] if row else 0
+    (max_id,) = conn.execute("SELECT MAX(rowid) FROM vehicle_data").fetchone()
+    if max_id is None or max_id <= last_id:
+        return 0
+
+    # Aggregate the new rows once per vehicle-hour; the daily rollup and the index are fed from that.
+    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS analytics_delta (vehicle_id, hour, {', '.join(AGGREGATES)})")
+    conn.execute("DELETE FROM temp.analytics_delta")
+    conn.execute(f'''
+        INSERT INTO temp.analytics_delta
+        SELECT vehicle_id, substr(event_time, 1, 13) || ':00:00', COUNT(*), SUM(engine_state = 'ON'),
+               SUM(speed), MAX(speed), MAX({_base_distance_sql(conn)}),
+               MIN(latitude), MAX(latitude), MIN(longitude), MAX(longitude)
+        FROM vehicle_data
+        WHERE rowid > ? AND rowid <= ?
+            -- Only tables from before the id column can hold such rows; they are left for the migration.
+            AND vehicle_id IS NOT NULL AND event_time IS NOT NULL
+        GROUP BY 1, 2
+    ''', (last_id, max_id))
+    _upsert(conn, "vehicle_hourly", "hour", "SELECT * FROM temp.analytics_delta")
+    aggregates = ", ".join(f"{function}({column})" for column, function in AGGREGATES.items())
+    _upsert(conn, "vehicle_daily", "day",
+            f"SELECT vehicle_id, substr(hour, 1, 10), {aggregates} FROM temp.analytics_delta GROUP BY 1, 2")
+    conn.execute(f'''
+        INSERT OR REPLACE INTO {SPATIAL_INDEX} (id, min_lat, max_lat, min_lon, max_lon)
+        SELECT h.id, h.min_latitude, h.max_latitude, h.min_longitude, h.max_longitude
+        FROM temp.analytics_delta d
+        JOIN vehicle_hourly h ON h.vehicle_id = d.vehicle_id AND h.hour = d.hour
+        WHERE h.min_latitude IS NOT NULL AND h.min_longitude IS NOT NULL
+    ''')
+    conn.execute(
+        "INSERT INTO analytics_state (name, last_id) VALUES ('vehicle_data', ?) "
+        "ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id", (max_id,)
+    )
+    return max_id - last_id
+
+
+def rebuild_analytics(conn) -> int:
+    """Recompute the rollups and the spatial index from scratch. Does not commit."""
+    for table in ROLLUPS:
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute(f"DELETE FROM {SPATIAL_INDEX}")
+    conn.execute("DELETE FROM analytics_state")
+    return refresh_analytics(conn)
+
+
+def has_analytics(schema) -> bool:
+    return all(table in schema for table in ROLLUPS)
+
+
+def analytics_prompt() -> str:
+    """Describe the precomputed structures so generated SQL uses them instead of scanning vehicle_data."""
+    return (
+        "Precomputed analytics (prefer these over scanning vehicle_data):\n"
+        "- vehicle_hourly has one row per vehicle per hour ('YYYY-MM-DD HH:00:00' in column hour) and "
+        "vehicle_daily one per vehicle per day ('YYYY-MM-DD' in column day). Average speed is "
+        "speed_sum / samples, engine-on share is on_samples / samples, max_base_km is the farthest distance "
+        "from base in km, and min/max_latitude and min/max_longitude bound the positions.\n"
+        f"- {SPATIAL_INDEX} is an R-tree of each vehicle_hourly row's position bounds (id = vehicle_hourly.id). "
+        f"For a bounding box, join vehicle_hourly ON vehicle_hourly.id = {SPATIAL_INDEX}.id WHERE "
+        "max_lat >= :south AND min_lat <= :north AND max_lon >= :west AND min_lon <= :east; for exact points, "
+        "filter the vehicle_data rows of those vehicles and hours by latitude and longitude.\n"
+        "- haversine_km(lat1, lon1, lat2, lon2) returns the great-circle distance in km.\n"
+        "- Timestamps are text 'YYYY-MM-DD HH:MM:SS'; use date('now', '-1 day') style arithmetic."
+    )
@@ -0,0 +1,390 @@
+import argparse
+import csv
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+
+from sql_engine import frame_from_cursor
+from vehicle_analytics import create_analytics, rebuild_analytics, refresh_analytics, register_functions
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("vehicle_id", "event_time", "latitude", "longitude", "speed", "engine_state",
+           "base_latitude", "base_longitude")
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+)
+
+TABLE_DEFINITION = '''(
+    id INTEGER PRIMARY KEY,
+    vehicle_id TEXT NOT NULL,
+    event_time TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    speed REAL,
+    engine_state TEXT,
+    base_latitude REAL,
+    base_longitude REAL
+)'''
+
+INDEXES = {
+    "idx_vehicle_data_vehicle_time": "vehicle_data (vehicle_id, event_time)",
+    "idx_vehicle_data_time": "vehicle_data (event_time)",
+}
+
+
+def format_event_time(value):
+    """Normalize a timestamp to sortable ISO-8601 text ('YYYY-MM-DD HH:MM:SS')."""
+    if isinstance(value, str):
+        return value.replace("T", " ")[:19]
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def strip_semicolon(query: str) -> str:
+    return query.strip().rstrip(";").strip()
+
+
+def limit_query(query: str, limit: int, offset: int = 0) -> str:
+    """Wrap a SELECT so only `limit` rows from `offset` are produced."""
+    return f"SELECT * FROM ({strip_semicolon(query)}) LIMIT {int(limit)} OFFSET {int(offset)}"
+
+
+class ConnectionPool:
+    """A fixed-size pool of tuned SQLite connections to one database file."""
+
+    def __init__(self, db_file: str, size: int = 4):
+        self.db_file = db_file
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        register_functions(conn)
+        return conn
+
+    def acquire(self, timeout: float = None):
+        """Check out a connection, opening a new one while the pool is below its size."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    return self._connect()
+        return self._idle.get(timeout=timeout)
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_file: str, size: int = 4) -> ConnectionPool:
+    """Return the process-wide connection pool for a database file."""
+    with _pools_lock:
+        if db_file not in _pools:
+            _pools[db_file] = ConnectionPool(db_file, size)
+        return _pools[db_file]
+
+
+class VehicleDatabase:
+    """
+    Storage for vehicle telemetry backed by a pooled, WAL-mode SQLite connection.
+    The hourly/daily rollups and the position R-tree from `vehicle_analytics` are brought up
+    to date in the same transaction as every insert.
+    """
+
+    def __init__(self, db_file, pool: ConnectionPool = None):
+        self.pool = pool or get_pool(db_file)
+        self.conn = self.pool.acquire()
+        self.c = self.conn.cursor()
+        self.create_table()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def create_table(self):
+        self.c.execute(f"CREATE TABLE IF NOT EXISTS vehicle_data {TABLE_DEFINITION}")
+        if self.needs_migration():
+            logger.warning(f"{self.pool.db_file}: vehicle_data predates the id column; "
+                           f"run `python vehicle_db.py --migrate {self.pool.db_file}` to upgrade it.")
+        self.create_indexes()
+        create_analytics(self.conn)
+        # Existing databases get their analytics backfilled once; afterwards this is a no-op check.
+        refresh_analytics(self.conn)
+        self.conn.commit()
+
+    def needs_migration(self) -> bool:
+        """Whether `vehicle_data` was created before the `id` column existed."""
+        return "id" not in [row[1] for row in self.c.execute("PRAGMA table_info(vehicle_data)")]
+
+    def migrate_table(self) -> bool:
+        """
+        Rebuild a `vehicle_data` table created before the `id` column existed, normalizing its
+        timestamps to the sortable text format. Rows without a vehicle ID or time cannot be kept
+        in the new table and are moved to `vehicle_data_rejected`. Runs in one transaction, so an
+        error leaves the old table untouched. Returns False if there was nothing to migrate.
+        """
+        if not self.needs_migration():
+            return False
+        self.conn.commit()
+        (total,) = self.c.execute("SELECT COUNT(*) FROM vehicle_data").fetchone()
+        logger.info(f"Migrating {total} vehicle_data rows to the current schema.")
+        # ALTER TABLE would otherwise commit on its own, leaving a half-migrated database on a crash.
+        self.c.execute("BEGIN")
+        try:
+            self.c.execute("ALTER TABLE vehicle_data RENAME TO vehicle_data_old")
+            self.c.execute(f"CREATE TABLE vehicle_data {TABLE_DEFINITION}")
+            self.c.execute(f'''
+                INSERT INTO vehicle_data (id, {", ".join(COLUMNS)})
+                SELECT NULL, vehicle_id, substr(replace(event_time, 'T', ' '), 1, 19), {", ".join(COLUMNS[2:])}
+                FROM vehicle_data_old
+                WHERE vehicle_id IS NOT NULL AND event_time IS NOT NULL
+                ORDER BY rowid
+            ''')
+            rejected = total - self.c.rowcount
+            if rejected:
+                self.c.execute(
+                    f"CREATE TABLE IF NOT EXISTS vehicle_data_rejected (old_rowid, {', '.join(COLUMNS)})"
+                )
+                self.c.execute(f'''
+                    INSERT INTO vehicle_data_rejected
+                    SELECT rowid, {", ".join(COLUMNS)} FROM vehicle_data_old
+                    WHERE vehicle_id IS NULL OR event_time IS NULL
+                ''')
+                logger.warning(f"Moved {rejected} vehicle_data rows without a vehicle ID or time to "
+                               f"vehicle_data_rejected.")
+            self.c.execute("DROP TABLE vehicle_data_old")
+            self.create_indexes()
+            # Row IDs and timestamps changed, so the rollups built on the old table are stale.
+            rebuild_analytics(self.conn)
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return True
+
+    def create_indexes(self):
+        for name, target in INDEXES.items():
+            self.c.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+    def drop_indexes(self):
+        for name in INDEXES:
+            self.c.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def insert_vehicles(self, records):
+        self.c.executemany(f'''
+            INSERT INTO vehicle_data ({", ".join(COLUMNS)}) VALUES (?,?,?,?,?,?,?,?)
+        ''', records)
+        refresh_analytics(self.conn)
+        self.conn.commit()
+
+    def bulk_load(self, records, chunk_size: int = 50_000, defer_indexes: bool = False, on_progress=None):
+        """
+        Insert an iterable of 8-column records in chunked transactions and return rows/sec.
+
+        With `defer_indexes`, indexes are dropped for the load and rebuilt once at the end,
+        which is much faster for loads that are large relative to the existing table.
+        """
+        records = iter(records)
+
+        def chunks():
+            while True:
+                chunk = [(r[0], format_event_time(r[1]), *r[2:8]) for r in islice(records, chunk_size)]
+                if not chunk:
+                    return
+                yield chunk
+
+        return self._load(chunks(), defer_indexes, on_progress)
+
+    def bulk_load_columns(self, batches, defer_indexes: bool = False, on_progress=None):
+        """
+        Insert columnar batches (mappings of column name to a sequence or NumPy array, with
+        `event_time` already formatted as text) one transaction per batch and return rows/sec.
+        """
+        def chunks():
+            for batch in batches:
+                columns = [batch[column] for column in COLUMNS]
+                yield list(zip(*(getattr(values, "tolist", lambda: values)() for values in columns)))
+
+        return self._load(chunks(), defer_indexes, on_progress)
+
+    def _load(self, chunks, defer_indexes: bool, on_progress):
+        rows, started = 0, time.perf_counter()
+        if defer_indexes:
+            self.drop_indexes()
+            self.conn.commit()
+        try:
+            for chunk in chunks:
+                self.c.execute("BEGIN")
+                self.c.executemany(
+                    f"INSERT INTO vehicle_data ({', '.join(COLUMNS)}) VALUES (?,?,?,?,?,?,?,?)", chunk
+                )
+                refresh_analytics(self.conn)
+                self.conn.commit()
+                rows += len(chunk)
+                if on_progress:
+                    on_progress(rows, rows / (time.perf_counter() - started))
+        finally:
+            if defer_indexes:
+                self.create_indexes()
+                self.conn.commit()
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0.0
+        logger.info(f"Bulk loaded {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+        return rate
+
+    def refresh_analytics(self, rebuild: bool = False) -> int:
+        """
+        Bring the rollups and the position index up to date and return the rows folded in.
+        Pass `rebuild` after updating or deleting telemetry rows to recompute them from scratch.
+        """
+        rows = rebuild_analytics(self.conn) if rebuild else refresh_analytics(self.conn)
+        self.conn.commit()
+        return rows
+
+    def load_csv(self, path: str, **kwargs):
+        """Stream a CSV file with a header naming the vehicle_data columns into the table."""
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            return self.bulk_load((tuple(row[column] for column in COLUMNS) for row in reader), **kwargs)
+
+    def load_parquet(self, path: str, batch_size: int = 50_000, **kwargs):
+        """Stream a Parquet file into the table one record batch at a time (requires pyarrow)."""
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Loading Parquet files requires pyarrow: pip install pyarrow") from e
+
+        def records():
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=list(COLUMNS)):
+                yield from zip(*(batch.column(column).to_pylist() for column in COLUMNS))
+
+        return self.bulk_load(records(), chunk_size=batch_size, **kwargs)
+
+    def fetch_data(self, query, params=()):
+        self.c.execute(query, params)
+        return self.c.fetchall()
+
+    def fetch_frame(self, query, params=()):
+        """Run a query and return a DataFrame with the columns it actually selects."""
+        self.c.execute(query, params)
+        return frame_from_cursor(self.c, self.c.fetchall())
+
+    def page(self, query, page_size: int = 50, page: int = 0, params=()):
+        """Return one page of a query's results as a DataFrame, without running the full result."""
+        return self.fetch_frame(limit_query(query, page_size, page * page_size), params)
+
+    def count_rows(self, query, params=(), timeout: float = 2.0):
+        """
+        Return the number of rows a query produces, or None if counting takes longer than `timeout`.
+        """
+        deadline = time.perf_counter() + timeout
+        self.conn.set_progress_handler(lambda: time.perf_counter() > deadline, 10_000)
+        try:
+            (count,) = self.conn.execute(f"SELECT COUNT(*) FROM ({strip_semicolon(query)})", params).fetchone()
+            return count
+        except sqlite3.OperationalError as e:
+            if "interrupted" not in str(e):
+                raise
+            logger.info(f"Row count abandoned after {timeout}s.")
+            return None
+        finally:
+            self.conn.set_progress_handler(None, 0)
+
+    def iter_pages(self, query, page_size: int = 10_000, params=()):
+        """Yield the full result of a query as DataFrames of at most `page_size` rows."""
+        cursor = self.conn.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    break
+                yield frame_from_cursor(cursor, rows)
+        finally:
+            cursor.close()
+
+    def export(self, query, path: str, params=(), chunk_size: int = 50_000):
+        """
+        Write the full result of a query to CSV or Parquet (by file extension) in chunks.
+        Returns the number of rows written.
+        """
+        rows = 0
+        if path.endswith(".parquet"):
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("Exporting Parquet files requires pyarrow: pip install pyarrow") from e
+            writer = None
+            try:
+                for frame in self.iter_pages(query, chunk_size, params):
+                    table = pa.Table.from_pandas(frame, preserve_index=False)
+                    writer = writer or pq.ParquetWriter(path, table.schema)
+                    writer.write_table(table)
+                    rows += len(frame)
+            finally:
+                if writer:
+                    writer.close()
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                for frame in self.iter_pages(query, chunk_size, params):
+                    frame.to_csv(f, header=rows == 0, index=False)
+                    rows += len(frame)
+        logger.info(f"Exported {rows} rows to {path}.")
+        return rows
+
+    def close(self):
+        """Return the connection to the pool."""
+        if self.conn is not None:
+            self.c.close()
+            self.pool.release(self.conn)
+            self.conn = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain a vehicle telemetry database.")
+    parser.add_argument("db", help="SQLite database file")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Upgrade a vehicle_data table created before the id column")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with VehicleDatabase(args.db) as db:
+        if args.migrate:
+            print("Migrated." if db.migrate_table() else "Already up to date.")
+
+
+if __name__ == "__main__":
+    main()